@@ -0,0 +1,114 @@
+"""Servidor HTTP local que imita os endpoints de forecast e archive da Open-Meteo.
+
+Responde com dados de benchmarks/synthetic.py e permite injetar latência, erros 5xx
+e respostas 429 para medir a extração sem depender da API real.
+
+Uso: python benchmarks/mock_open_meteo.py --port 8765 --latency-ms 80 --error-rate 0.02 --rate-429 0.05
+"""
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic import daily_block, hourly_block
+
+FORECAST_DAYS = 7
+
+
+class MockOpenMeteoHandler(BaseHTTPRequestHandler):
+    # configurados por start_server
+    latency = 0.0
+    error_rate = 0.0
+    rate_429 = 0.0
+    stats = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = parse_qs(url.query)
+        self._count('requests')
+
+        if self.latency:
+            time.sleep(self.latency)
+        roll = random.random()
+        if roll < self.rate_429:
+            self._count('429')
+            return self._send(429, {"error": True, "reason": "Too many requests"})
+        if roll < self.rate_429 + self.error_rate:
+            self._count('5xx')
+            return self._send(503, {"error": True, "reason": "Injected failure"})
+
+        try:
+            latitudes = [float(v) for v in params['latitude'][0].split(',')]
+            longitudes = [float(v) for v in params['longitude'][0].split(',')]
+        except (KeyError, ValueError):
+            return self._send(400, {"error": True, "reason": "latitude/longitude inválidos"})
+
+        if url.path.endswith('/archive'):
+            start = datetime.date.fromisoformat(params['start_date'][0])
+            end = datetime.date.fromisoformat(params['end_date'][0])
+        else:
+            start = datetime.date.today()
+            end = start + datetime.timedelta(days=FORECAST_DAYS - 1)
+
+        locations = [
+            {"latitude": lat, "longitude": lon, "daily": daily_block(lat, lon, start, end)}
+            for lat, lon in zip(latitudes, longitudes)
+        ]
+        if 'hourly' in params:
+            for location in locations:
+                location['hourly'] = hourly_block(location['latitude'], location['longitude'], start, end)
+        self._count('locations', len(locations))
+        # como a API real: objeto para uma coordenada, lista para várias
+        self._send(200, locations[0] if len(locations) == 1 else locations)
+
+    def _count(self, key, value=1):
+        with self.stats['lock']:
+            self.stats[key] = self.stats.get(key, 0) + value
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(port=0, latency_ms=0, error_rate=0.0, rate_429=0.0):
+    """Sobe o mock numa thread e devolve (server, base_url, stats)."""
+    stats = {'lock': threading.Lock()}
+    handler = type('Handler', (MockOpenMeteoHandler,), {
+        'latency': latency_ms / 1000.0,
+        'error_rate': error_rate,
+        'rate_429': rate_429,
+        'stats': stats
+    })
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}", stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock local da Open-Meteo")
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    args = parser.parse_args()
+    server, base_url, _ = start_server(args.port, args.latency_ms, args.error_rate, args.rate_429)
+    print(f"Mock Open-Meteo em {base_url} (forecast: {base_url}/v1/forecast, archive: {base_url}/v1/archive)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
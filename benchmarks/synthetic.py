@@ -0,0 +1,88 @@
+"""Gerador de dados sintéticos: N regiões × M anos de valores diários determinísticos.
+
+Os mesmos valores são servidos pelo mock da Open-Meteo e gravados direto em
+weather_raw, então uma carga pela API e uma carga sintética produzem o mesmo banco.
+"""
+import datetime
+import hashlib
+import json
+import math
+
+
+def synthetic_regions(count):
+    """Regiões fictícias espalhadas numa grade em torno do DF, com coordenadas únicas."""
+    side = max(1, math.ceil(math.sqrt(count)))
+    return [
+        {
+            "name": f"Regiao {i:03d}",
+            "lat": round(-15.5 - (i // side) * 0.05, 4),
+            "lon": round(-48.3 + (i % side) * 0.05, 4)
+        }
+        for i in range(count)
+    ]
+
+
+def daily_values(lat, lon, day):
+    """(máx, mín, precipitação) pseudo-aleatórios mas estáveis para um ponto e um dia."""
+    digest = hashlib.blake2b(f"{lat:.4f}|{lon:.4f}|{day}".encode(), digest_size=6).digest()
+    a, b, c = digest[0:2], digest[2:4], digest[4:6]
+    season = math.cos((day.timetuple().tm_yday - 15) / 365.0 * 2 * math.pi)
+    temp_max = round(27 + 2.5 * season + int.from_bytes(a, 'big') / 65535 * 6 - 3, 1)
+    temp_min = round(temp_max - 8 - int.from_bytes(b, 'big') / 65535 * 6, 1)
+    rain = int.from_bytes(c, 'big') / 65535
+    precipitation = round(-math.log(1 - rain * 0.999) * 4, 1) if season > -0.2 and rain > 0.4 else 0.0
+    return temp_max, temp_min, precipitation
+
+
+def daily_block(lat, lon, start, end):
+    """Bloco 'daily' no formato da resposta da Open-Meteo."""
+    times, temp_max, temp_min, precipitation = [], [], [], []
+    day = start
+    while day <= end:
+        values = daily_values(lat, lon, day)
+        times.append(day.isoformat())
+        temp_max.append(values[0])
+        temp_min.append(values[1])
+        precipitation.append(values[2])
+        day += datetime.timedelta(days=1)
+    return {
+        "time": times,
+        "temperature_2m_max": temp_max,
+        "temperature_2m_min": temp_min,
+        "precipitation_sum": precipitation
+    }
+
+
+def hourly_block(lat, lon, start, end):
+    """Bloco 'hourly' coerente com daily_block: mínima às 3h, máxima às 15h e a chuva do dia às 16h."""
+    times, temperature, precipitation = [], [], []
+    day = start
+    while day <= end:
+        temp_max, temp_min, rain = daily_values(lat, lon, day)
+        for hour in range(24):
+            shape = 0.5 - 0.5 * math.cos((hour - 3) / 24 * 2 * math.pi)
+            times.append(f"{day.isoformat()}T{hour:02d}:00")
+            temperature.append(round(temp_min + (temp_max - temp_min) * shape, 1))
+            precipitation.append(rain if hour == 16 else 0.0)
+        day += datetime.timedelta(days=1)
+    return {
+        "time": times,
+        "temperature_2m": temperature,
+        "precipitation": precipitation
+    }
+
+
+def raw_rows(regions, start, end):
+    """Linhas de weather_raw (regiao, data, raw_data) para todas as regiões no intervalo."""
+    for region in regions:
+        daily = daily_block(region['lat'], region['lon'], start, end)
+        for i, day in enumerate(daily['time']):
+            yield {
+                'regiao': region['name'],
+                'data': day,
+                'raw_data': json.dumps({
+                    "temperature_2m_max": daily['temperature_2m_max'][i],
+                    "temperature_2m_min": daily['temperature_2m_min'][i],
+                    "precipitation_sum": daily['precipitation_sum'][i]
+                })
+            }
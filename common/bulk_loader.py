@@ -0,0 +1,185 @@
+"""Upserts em massa para o MySQL, usados pela extração (weather_raw) e pela transformação (weather_daily).
+
+Duas estratégias:
+
+- ``values``: INSERT com várias linhas por comando (``VALUES (...),(...)``), cada
+  comando dimensionado para caber em ``max_allowed_packet``;
+- ``infile``: grava as linhas num arquivo TSV temporário, carrega numa tabela
+  temporária de staging com ``LOAD DATA LOCAL INFILE`` e mescla no destino com um
+  único ``INSERT ... SELECT ... ON DUPLICATE KEY UPDATE``.
+
+``auto`` (padrão) escolhe pela quantidade de linhas. Se o servidor recusar
+``LOAD DATA LOCAL`` a carga cai para ``values``.
+"""
+import datetime
+import logging
+import math
+import os
+import tempfile
+
+import pandas as pd
+from sqlalchemy.exc import DBAPIError
+
+logger = logging.getLogger(__name__)
+
+# fração de max_allowed_packet usada por comando (folga para escapes e cabeçalho)
+PACKET_USAGE = 0.8
+DEFAULT_MAX_PACKET = 4 * 1024 * 1024
+
+_max_packet_cache = {}
+_infile_disabled = False
+
+# erros do MySQL/driver que indicam LOAD DATA LOCAL desabilitado no servidor ou no cliente
+# (1148 ER_NOT_ALLOWED_COMMAND, 3948 ER_CLIENT_LOCAL_FILES_DISABLED, 2068 CR_LOAD_DATA_LOCAL_INFILE_REJECTED)
+INFILE_UNAVAILABLE_ERRORS = (1148, 3948, 2068)
+
+
+def _rows_as_tuples(rows):
+    """Normaliza DataFrame ou lista de dicts em (colunas, lista de tuplas) com None no lugar de NaN."""
+    if isinstance(rows, pd.DataFrame):
+        columns = list(rows.columns)
+        values = rows.astype(object).where(rows.notna(), None)
+        return columns, list(values.itertuples(index=False, name=None))
+    rows = list(rows)
+    if not rows:
+        return [], []
+    columns = list(rows[0].keys())
+    return columns, [tuple(_clean(row.get(column)) for column in columns) for row in rows]
+
+
+def _clean(value):
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+def max_allowed_packet(conn):
+    key = str(conn.engine.url)
+    if key not in _max_packet_cache:
+        try:
+            _max_packet_cache[key] = int(conn.exec_driver_sql("SELECT @@max_allowed_packet").scalar())
+        except DBAPIError:
+            _max_packet_cache[key] = DEFAULT_MAX_PACKET
+    return _max_packet_cache[key]
+
+
+def _update_clause(update_columns):
+    return ", ".join(f"{column} = VALUES({column})" for column in update_columns)
+
+
+def upsert_values(conn, table, columns, rows, update_columns):
+    """INSERT multi-linha; devolve a quantidade de comandos enviados."""
+    head = f"INSERT INTO {table} ({', '.join(columns)}) VALUES "
+    tail = f" ON DUPLICATE KEY UPDATE {_update_clause(update_columns)}"
+    placeholder = "(" + ", ".join(["%s"] * len(columns)) + ")"
+    budget = int(max_allowed_packet(conn) * PACKET_USAGE) - len(head) - len(tail)
+
+    statements = 0
+    batch, size = [], 0
+    for row in rows:
+        # estimativa do tamanho já escapado: texto de cada valor + aspas e separadores
+        row_size = sum(len(str(value)) + 4 for value in row) + 4
+        if batch and size + row_size > budget:
+            _execute_values(conn, head, tail, placeholder, batch)
+            statements += 1
+            batch, size = [], 0
+        batch.append(row)
+        size += row_size
+    if batch:
+        _execute_values(conn, head, tail, placeholder, batch)
+        statements += 1
+    return statements
+
+
+def _execute_values(conn, head, tail, placeholder, batch):
+    sql = head + ", ".join([placeholder] * len(batch)) + tail
+    params = tuple(value for row in batch for value in row)
+    conn.exec_driver_sql(sql, params)
+
+
+def _tsv_value(value):
+    if value is None:
+        return "\\N"
+    if isinstance(value, datetime.datetime) and value.time() == datetime.time(0):
+        value = value.date()
+    text = value.isoformat(sep=' ') if isinstance(value, datetime.datetime) else str(value)
+    return text.replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
+def _infile_unavailable(error):
+    args = getattr(error.orig, 'args', None)
+    return bool(args) and args[0] in INFILE_UNAVAILABLE_ERRORS
+
+
+def upsert_infile(conn, table, columns, rows, update_columns):
+    """Carga via LOAD DATA LOCAL INFILE numa tabela temporária seguida de um merge único.
+
+    Devolve None, sem tocar no destino, se o servidor ou o driver recusar LOAD DATA LOCAL;
+    qualquer outro erro (deadlock, lock wait, chave duplicada...) é propagado.
+    """
+    staging = f"{table}_staging"
+    column_list = ", ".join(columns)
+    # tabelas temporárias são por conexão e não geram commit implícito; criada só com as
+    # colunas da carga (LIKE copiaria o particionamento, que tabelas temporárias não aceitam)
+    conn.exec_driver_sql(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+    conn.exec_driver_sql(f"CREATE TEMPORARY TABLE {staging} SELECT {column_list} FROM {table} LIMIT 0")
+
+    with tempfile.NamedTemporaryFile('w', encoding='utf-8', suffix='.tsv', newline='\n', delete=False) as handle:
+        for row in rows:
+            handle.write("\t".join(_tsv_value(value) for value in row) + "\n")
+        path = handle.name
+    try:
+        conn.exec_driver_sql(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {staging} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' ({column_list})",
+            (path,)
+        )
+    except DBAPIError as e:
+        if not _infile_unavailable(e):
+            raise
+        conn.exec_driver_sql(f"DROP TEMPORARY TABLE IF EXISTS {staging}")
+        logger.warning(f"LOAD DATA LOCAL INFILE indisponível ({e.orig}), usando INSERT multi-linha")
+        return None
+    finally:
+        os.unlink(path)
+
+    conn.exec_driver_sql(
+        f"INSERT INTO {table} ({column_list}) SELECT {column_list} FROM {staging} "
+        f"ON DUPLICATE KEY UPDATE {_update_clause(update_columns)}"
+    )
+    conn.exec_driver_sql(f"DROP TEMPORARY TABLE {staging}")
+    return 2
+
+
+def choose_strategy(row_count, strategy=None):
+    strategy = strategy or os.getenv('BULK_LOAD_STRATEGY', 'auto')
+    if strategy != 'auto':
+        return strategy
+    threshold = int(os.getenv('BULK_INFILE_THRESHOLD', '20000'))
+    return 'infile' if row_count >= threshold and not _infile_disabled else 'values'
+
+
+def bulk_upsert(conn, table, rows, update_columns, strategy=None):
+    """Upsert de `rows` (DataFrame ou lista de dicts) em `table` dentro da transação de `conn`.
+
+    As colunas de `update_columns` são sobrescritas quando a chave única já existe.
+    Devolve o número de linhas enviadas.
+    """
+    global _infile_disabled
+
+    columns, tuples = _rows_as_tuples(rows)
+    if not tuples:
+        return 0
+
+    strategy = choose_strategy(len(tuples), strategy)
+    if strategy == 'infile':
+        statements = upsert_infile(conn, table, columns, tuples, update_columns)
+        if statements is not None:
+            logger.debug(f"{table}: {len(tuples)} linhas via LOAD DATA em {statements} comandos")
+            return len(tuples)
+        # servidor ou driver sem local_infile habilitado: não insistir nas próximas cargas
+        _infile_disabled = True
+
+    statements = upsert_values(conn, table, columns, tuples, update_columns)
+    logger.debug(f"{table}: {len(tuples)} linhas em {statements} comandos INSERT")
+    return len(tuples)
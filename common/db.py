@@ -0,0 +1,9 @@
+from sqlalchemy import create_engine
+
+
+def create_etl_engine(database_url, **kwargs):
+    """Engine do ETL; em MySQL habilita LOAD DATA LOCAL INFILE para o bulk loader."""
+    if database_url.startswith('mysql'):
+        connect_args = kwargs.setdefault('connect_args', {})
+        connect_args.setdefault('local_infile', True)
+    return create_engine(database_url, **kwargs)
@@ -0,0 +1,135 @@
+"""Exportação sob demanda de weather_daily para CSV ou Parquet, lida do banco em blocos.
+
+As linhas vêm por um cursor do lado do servidor (stream_results) em blocos de
+EXPORT_CHUNK_SIZE e são gravadas direto em disco, então a memória usada não depende
+do tamanho da exportação. Arquivos prontos ficam em cache por EXPORT_CACHE_TTL_SECONDS,
+identificados pelos filtros e pela versão dos dados. estimate_size conta as linhas
+antes da geração, para recusar exportações grandes demais sem gravá-las.
+"""
+import hashlib
+import logging
+import os
+import time
+
+import pandas as pd
+from sqlalchemy import bindparam, text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'exports')
+EXPORT_COLUMNS = 'regiao, data, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica'
+FORMATS = {'csv': '.csv', 'parquet': '.parquet'}
+# bytes por linha de weather_daily no arquivo, com folga (nome da região + data + 4 métricas)
+BYTES_PER_ROW = {'csv': 90, 'parquet': 40}
+
+
+def export_dir():
+    return os.getenv('EXPORT_DIR', DEFAULT_DIR)
+
+
+def export_name(regions, start, end, fmt, version=None):
+    """Nome do arquivo: legível pelo intervalo e único pelos filtros e pela versão dos dados."""
+    key = '|'.join([','.join(sorted(regions)), str(start), str(end), fmt, str(version)])
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:12]
+    return f"clima_{start}_{end}_{digest}{FORMATS[fmt]}"
+
+
+def purge_expired(directory, ttl):
+    """Remove exportações mais antigas que o TTL (e temporários esquecidos)."""
+    now = time.time()
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if now - os.path.getmtime(path) > ttl:
+                os.unlink(path)
+        except OSError:
+            pass
+
+
+def estimate_size(engine, regions, start, end, fmt='csv'):
+    """(linhas, bytes estimados) da exportação, contando as linhas pelo índice de cobertura."""
+    query = text("""
+        SELECT COUNT(*) FROM weather_daily
+        WHERE regiao_id IN (SELECT regiao_id FROM dim_regiao WHERE nome IN :regioes)
+          AND data >= :inicio AND data <= :fim
+    """).bindparams(bindparam('regioes', expanding=True))
+    with engine.connect() as conn:
+        rows = conn.execute(query, {'regioes': list(regions), 'inicio': start, 'fim': end}).scalar() or 0
+    return rows, rows * BYTES_PER_ROW[fmt]
+
+
+def read_chunks(engine, regions, start, end, chunk_size):
+    query = text(f"""
+        SELECT {EXPORT_COLUMNS} FROM weather_daily
+        WHERE regiao_id IN (SELECT regiao_id FROM dim_regiao WHERE nome IN :regioes)
+          AND data >= :inicio AND data <= :fim
+        ORDER BY regiao, data
+    """).bindparams(bindparam('regioes', expanding=True))
+    with engine.connect().execution_options(stream_results=True) as conn:
+        yield from pd.read_sql(query, conn, params={'regioes': list(regions), 'inicio': start, 'fim': end},
+                               chunksize=chunk_size)
+
+
+def write_csv(chunks, path):
+    rows = 0
+    with open(path, 'w', encoding='utf-8', newline='') as handle:
+        for position, chunk in enumerate(chunks):
+            chunk.to_csv(handle, index=False, header=position == 0)
+            rows += len(chunk)
+        if rows == 0:
+            handle.write(EXPORT_COLUMNS.replace(' ', '') + '\n')
+    return rows
+
+
+def write_parquet(chunks, path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([
+        ('regiao', pa.string()),
+        ('data', pa.date32()),
+        ('temperatura_maxima', pa.float32()),
+        ('temperatura_minima', pa.float32()),
+        ('precipitacao_total', pa.float32()),
+        ('amplitude_termica', pa.float32())
+    ])
+    rows = 0
+    # cada bloco vira um row group; o arquivo nunca é montado inteiro em memória
+    with pq.ParquetWriter(path, schema, compression='zstd') as writer:
+        for chunk in chunks:
+            chunk['data'] = pd.to_datetime(chunk['data']).dt.date
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    return rows
+
+
+def export_daily(engine, regions, start, end, fmt='csv', version=None, directory=None, chunk_size=None, ttl=None):
+    """Gera (ou reaproveita do cache) a exportação de weather_daily e devolve o caminho do arquivo.
+
+    `start`/`end` são inclusivos. `version` (ex.: daily_loaded_at) entra na chave do
+    cache, então uma nova carga do ETL gera um arquivo novo.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Formato de exportação desconhecido: {fmt}")
+    directory = directory or export_dir()
+    chunk_size = chunk_size or int(os.getenv('EXPORT_CHUNK_SIZE', '50000'))
+    ttl = ttl if ttl is not None else int(os.getenv('EXPORT_CACHE_TTL_SECONDS', '600'))
+    os.makedirs(directory, exist_ok=True)
+    purge_expired(directory, ttl)
+
+    path = os.path.join(directory, export_name(regions, start, end, fmt, version))
+    if os.path.exists(path):
+        return path
+
+    # grava num temporário e renomeia: downloads concorrentes nunca veem um arquivo pela metade
+    tmp = f"{path}.{os.getpid()}.tmp"
+    started = time.perf_counter()
+    try:
+        chunks = read_chunks(engine, regions, start, end, chunk_size)
+        rows = write_parquet(chunks, tmp) if fmt == 'parquet' else write_csv(chunks, tmp)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    logger.info(f"Exportação {os.path.basename(path)}: {rows} linhas em {time.perf_counter() - started:.1f}s")
+    return path
@@ -0,0 +1,83 @@
+"""Dados horários compactos: uma linha por região e dia com as 24 horas em arrays float32.
+
+Cada variável horária vira um BLOB de 24 × float32 little-endian (96 bytes), com NaN
+nas horas sem valor. Empacotar, desempacotar e agregar são operações vetorizadas do
+NumPy sobre todos os dias de uma vez, sem laço por hora nem JSON por linha.
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+
+HOURS = 24
+DTYPE = '<f4'
+# variável da API -> coluna BLOB em weather_hourly_raw
+HOURLY_FIELDS = {
+    'temperature_2m': 'temperatura',
+    'precipitation': 'precipitacao'
+}
+
+
+def pack_days(hourly):
+    """Converte o bloco 'hourly' da Open-Meteo em registros {data, <coluna>: bytes} por dia."""
+    times = pd.Series(hourly.get('time') or [], dtype='string')
+    if times.empty:
+        return []
+    frame = pd.DataFrame({'data': times.str.slice(0, 10), 'hora': times.str.slice(11, 13).astype(int)})
+    for key, column in HOURLY_FIELDS.items():
+        frame[column] = pd.to_numeric(pd.Series(hourly.get(key, [None] * len(times))), errors='coerce').to_numpy()
+
+    records = None
+    for column in HOURLY_FIELDS.values():
+        # dias × 24 horas; horas ausentes (ou dias incompletos) ficam NaN
+        grid = frame.pivot_table(index='data', columns='hora', values=column, aggfunc='first', dropna=False)
+        grid = grid.reindex(columns=range(HOURS))
+        values = grid.to_numpy(dtype=DTYPE)
+        if records is None:
+            records = [{'data': day} for day in grid.index]
+        for record, row in zip(records, values):
+            record[column] = row.tobytes()
+    return records
+
+
+def unpack(blobs):
+    """Série/lista de BLOBs (24 float32 cada) -> matriz dias × 24."""
+    blobs = [blob if blob is not None else np.full(HOURS, np.nan, dtype=DTYPE).tobytes() for blob in blobs]
+    if not blobs:
+        return np.empty((0, HOURS), dtype=DTYPE)
+    return np.frombuffer(b''.join(blobs), dtype=DTYPE).reshape(-1, HOURS)
+
+
+def daily_from_hourly(df_raw):
+    """Métricas diárias (mesmas colunas de decode_raw) a partir das matrizes horárias.
+
+    Só dias com as 24 horas preenchidas geram valores; dias incompletos ficam NaN e
+    são descartados pela transformação até a API completar o dia.
+    """
+    df = df_raw[['regiao', 'data']].copy()
+    temperature = unpack(df_raw['temperatura'])
+    precipitation = unpack(df_raw['precipitacao'])
+    complete = ~np.isnan(temperature).any(axis=1) & ~np.isnan(precipitation).any(axis=1)
+    with warnings.catch_warnings():
+        # linhas só com NaN geram aviso em nanmax/nanmin; elas são mascaradas logo abaixo
+        warnings.simplefilter('ignore', RuntimeWarning)
+        df['temperatura_maxima'] = np.where(complete, np.nanmax(temperature, axis=1), np.nan)
+        df['temperatura_minima'] = np.where(complete, np.nanmin(temperature, axis=1), np.nan)
+    df['precipitacao_total'] = np.where(complete, precipitation.sum(axis=1), np.nan)
+    # float32 -> float64 arredondado para não carregar ruído de precisão para weather_daily
+    for column in ('temperatura_maxima', 'temperatura_minima', 'precipitacao_total'):
+        df[column] = df[column].astype('float64').round(2)
+    df['data'] = pd.to_datetime(df['data'])
+    return df
+
+
+def hourly_frame(df_raw):
+    """Formato longo (regiao, hora, temperatura, precipitacao) para gráficos de um dia."""
+    temperature = unpack(df_raw['temperatura'])
+    precipitation = unpack(df_raw['precipitacao'])
+    return pd.DataFrame({
+        'regiao': np.repeat(df_raw['regiao'].to_numpy(), HOURS),
+        'hora': np.tile(np.arange(HOURS), len(df_raw)),
+        'temperatura': temperature.ravel().astype('float64'),
+        'precipitacao': precipitation.ravel().astype('float64')
+    })
@@ -0,0 +1,271 @@
+"""Métricas por etapa do ETL: timers, contadores, exportação e ledger de execuções.
+
+Cada execução (extração, transformação, pipeline) roda dentro de track_run, que
+ativa um RunMetrics para o processo. As funções instrumentadas chamam timer()/incr()
+deste módulo sem precisar receber o objeto; fora de uma execução elas não fazem nada.
+
+Ao final da execução são gravados:
+
+    <METRICS_DIR>/etl_<job>.prom   -> formato textfile do node_exporter (Prometheus)
+    <METRICS_DIR>/etl_<job>.json   -> resumo da execução
+    etl_runs                       -> uma linha por execução (tempos, linhas, falhas, watermark)
+"""
+import contextlib
+import datetime
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'metrics')
+
+
+def metrics_dir():
+    return os.getenv('METRICS_DIR', DEFAULT_DIR)
+
+
+class RunMetrics:
+    """Acumula duração por etapa e contadores de uma execução (thread-safe)."""
+
+    def __init__(self, job):
+        self.job = job
+        self.started_at = datetime.datetime.now()
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+        self.info = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def timer(self, stage, label=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, label)
+
+    def observe(self, stage, seconds, label=None):
+        with self.lock:
+            stats = self.stages.setdefault((stage, label), {'count': 0, 'seconds': 0.0, 'max': 0.0})
+            stats['count'] += 1
+            stats['seconds'] += seconds
+            stats['max'] = max(stats['max'], seconds)
+
+    def incr(self, counter, value=1):
+        with self.lock:
+            self.counters[counter] = self.counters.get(counter, 0) + value
+
+    def set(self, key, value):
+        with self.lock:
+            self.info[key] = value
+
+    def set_max(self, key, value):
+        with self.lock:
+            if key not in self.info or value > self.info[key]:
+                self.info[key] = value
+
+    def summary(self, status=None, error=None):
+        with self.lock:
+            stages = {}
+            for (stage, label), stats in sorted(self.stages.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+                entry = stages.setdefault(stage, {'count': 0, 'seconds': 0.0, 'max': 0.0})
+                entry['count'] += stats['count']
+                entry['seconds'] += stats['seconds']
+                entry['max'] = max(entry['max'], stats['max'])
+                if label is not None:
+                    entry.setdefault('labels', {})[label] = dict(stats)
+            return {
+                'job': self.job,
+                'status': status,
+                'started_at': self.started_at.isoformat(timespec='seconds'),
+                'duration_seconds': round(time.perf_counter() - self.started, 3),
+                'stages': stages,
+                'counters': dict(self.counters),
+                'info': dict(self.info),
+                'error': error
+            }
+
+
+class NullMetrics:
+    """Usado fora de track_run: instrumentação sem custo e sem efeito."""
+
+    @contextlib.contextmanager
+    def timer(self, stage, label=None):
+        yield
+
+    def observe(self, stage, seconds, label=None):
+        pass
+
+    def incr(self, counter, value=1):
+        pass
+
+    def set(self, key, value):
+        pass
+
+    def set_max(self, key, value):
+        pass
+
+
+NULL_METRICS = NullMetrics()
+# execução ativa no processo; global (e não contextvar) para valer também nas threads de fetch/gravação
+_active = None
+# status da última execução de cada job neste processo (consultado pelo scheduler)
+last_status = {}
+
+
+def current():
+    return _active or NULL_METRICS
+
+
+def timer(stage, label=None):
+    return current().timer(stage, label)
+
+
+def incr(counter, value=1):
+    current().incr(counter, value)
+
+
+def set_info(key, value):
+    current().set(key, value)
+
+
+def max_info(key, value):
+    current().set_max(key, value)
+
+
+def prometheus_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', ' ')
+
+
+def to_prometheus(summary):
+    """Resumo no formato de exposição do Prometheus (para o textfile collector)."""
+    job = prometheus_label(summary['job'])
+    lines = [
+        '# HELP etl_stage_seconds Tempo acumulado por etapa na última execução.',
+        '# TYPE etl_stage_seconds gauge',
+    ]
+    for stage, stats in summary['stages'].items():
+        lines.append(f'etl_stage_seconds{{job="{job}",stage="{stage}"}} {stats["seconds"]:.6f}')
+    lines += ['# HELP etl_stage_calls Chamadas por etapa na última execução.', '# TYPE etl_stage_calls gauge']
+    for stage, stats in summary['stages'].items():
+        lines.append(f'etl_stage_calls{{job="{job}",stage="{stage}"}} {stats["count"]}')
+    lines += ['# HELP etl_stage_max_seconds Chamada mais lenta por etapa na última execução.', '# TYPE etl_stage_max_seconds gauge']
+    for stage, stats in summary['stages'].items():
+        lines.append(f'etl_stage_max_seconds{{job="{job}",stage="{stage}"}} {stats["max"]:.6f}')
+        for label, detail in stats.get('labels', {}).items():
+            lines.append(
+                f'etl_stage_max_seconds{{job="{job}",stage="{stage}",detail="{prometheus_label(label)}"}} {detail["max"]:.6f}'
+            )
+    lines += ['# HELP etl_events Contadores da última execução.', '# TYPE etl_events gauge']
+    for counter, value in sorted(summary['counters'].items()):
+        lines.append(f'etl_events{{job="{job}",event="{counter}"}} {value}')
+    lines += [
+        '# HELP etl_last_run_duration_seconds Duração da última execução.',
+        '# TYPE etl_last_run_duration_seconds gauge',
+        f'etl_last_run_duration_seconds{{job="{job}"}} {summary["duration_seconds"]}',
+        '# HELP etl_last_run_success 1 se a última execução terminou sem falhas.',
+        '# TYPE etl_last_run_success gauge',
+        f'etl_last_run_success{{job="{job}"}} {1 if summary["status"] == "success" else 0}',
+        '# HELP etl_last_run_timestamp_seconds Fim da última execução (epoch).',
+        '# TYPE etl_last_run_timestamp_seconds gauge',
+        f'etl_last_run_timestamp_seconds{{job="{job}"}} {int(time.time())}',
+    ]
+    return '\n'.join(lines) + '\n'
+
+
+def write_atomic(path, content):
+    tmp = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as handle:
+        handle.write(content)
+    os.replace(tmp, path)
+
+
+def export(summary, directory=None):
+    """Grava o resumo em JSON e no textfile do Prometheus."""
+    directory = directory or metrics_dir()
+    os.makedirs(directory, exist_ok=True)
+    write_atomic(os.path.join(directory, f"etl_{summary['job']}.json"), json.dumps(summary, indent=2, default=str))
+    write_atomic(os.path.join(directory, f"etl_{summary['job']}.prom"), to_prometheus(summary))
+
+
+def start_ledger(engine, run):
+    with engine.begin() as conn:
+        result = conn.execute(text("""
+            INSERT INTO etl_runs (job, iniciado_em, status)
+            VALUES (:job, :inicio, 'running')
+        """), {'job': run.job, 'inicio': run.started_at})
+    return result.lastrowid
+
+
+def finish_ledger(engine, run_id, summary):
+    counters = summary['counters']
+    with engine.begin() as conn:
+        conn.execute(text("""
+            UPDATE etl_runs
+            SET finalizado_em = :fim, duracao_segundos = :duracao, status = :status,
+                linhas_lidas = :lidas, linhas_gravadas = :gravadas, falhas = :falhas,
+                watermark = :watermark, erro = :erro, metricas = :metricas
+            WHERE id = :id
+        """), {
+            'id': run_id,
+            'fim': datetime.datetime.now(),
+            'duracao': summary['duration_seconds'],
+            'status': summary['status'],
+            'lidas': counters.get('rows_read'),
+            'gravadas': counters.get('rows_written'),
+            'falhas': counters.get('failures', 0),
+            'watermark': summary['info'].get('watermark'),
+            'erro': (summary['error'] or '')[:2000] or None,
+            'metricas': json.dumps({'stages': summary['stages'], 'counters': counters}, default=str)
+        })
+
+
+@contextlib.contextmanager
+def track_run(engine, job):
+    """Ativa as métricas de uma execução e, ao sair, exporta e registra em etl_runs.
+
+    Status final: 'failed' se uma exceção escapou, 'partial' se houve falhas
+    contabilizadas (regiões/lotes perdidos) e 'success' caso contrário. Problemas
+    para gravar as métricas só geram aviso; nunca derrubam o ETL.
+    """
+    global _active
+    run = RunMetrics(job)
+    previous, _active = _active, run
+
+    run_id = None
+    if engine is not None and os.getenv('ETL_RUN_LEDGER', '1').lower() in ('1', 'true', 'yes'):
+        try:
+            run_id = start_ledger(engine, run)
+        except Exception as e:
+            logger.warning(f"Não foi possível registrar a execução em etl_runs: {e}")
+
+    status, error = 'success', None
+    try:
+        yield run
+    except BaseException as e:
+        status, error = 'failed', f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _active = previous
+        if status == 'success' and run.counters.get('failures'):
+            status = 'partial'
+        summary = run.summary(status, error)
+        last_status[job] = status
+        logger.info(
+            f"Execução {job} ({status}) em {summary['duration_seconds']:.1f}s - "
+            + ", ".join(f"{stage} {stats['seconds']:.1f}s" for stage, stats in summary['stages'].items())
+        )
+        try:
+            export(summary)
+        except OSError as e:
+            logger.warning(f"Não foi possível exportar métricas em {metrics_dir()}: {e}")
+        if run_id is not None:
+            try:
+                finish_ledger(engine, run_id, summary)
+            except Exception as e:
+                logger.warning(f"Não foi possível atualizar etl_runs: {e}")
@@ -0,0 +1,141 @@
+"""Manutenção das partições mensais (RANGE COLUMNS por data) das tabelas de fatos.
+
+Cada tabela tem uma partição por mês (pYYYYMM), a partição p_anterior para datas
+antigas e a partição coringa pfuture (MAXVALUE), que garante que nenhuma inserção
+falhe. ensure_future_partitions divide pfuture em meses até PARTITION_MONTHS_AHEAD
+meses à frente. REORGANIZE PARTITION copia as linhas de pfuture para as partições
+novas: na primeira execução depois da migração 005 num banco existente, pfuture
+guarda todas as linhas a partir de 2025, então essa execução reescreve todas elas
+(com bloqueio da tabela durante a cópia). Depois disso pfuture só recebe datas além
+do horizonte criado e fica vazia, e a reorganização mensal é instantânea;
+archive_partitions move partições antigas das tabelas brutas para tabelas de arquivo
+com EXCHANGE PARTITION e as remove da tabela principal; o corte é RAW_RETENTION_MONTHS
+meses antes do mês atual (retention_cutoff).
+"""
+import datetime
+import logging
+import os
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+PARTITIONED_TABLES = ('weather_raw', 'weather_daily', 'weather_hourly_raw')
+# tabelas brutas cujas partições anteriores ao corte de retenção podem ser arquivadas
+ARCHIVED_TABLES = ('weather_raw', 'weather_hourly_raw')
+FUTURE_PARTITION = 'pfuture'
+
+
+def add_months(day, months):
+    year, month = divmod(day.month - 1 + months, 12)
+    return datetime.date(day.year + year, month + 1, 1)
+
+
+def retention_cutoff(months=None, today=None):
+    """Primeiro dia do mês `months` meses antes do atual, ou None se a retenção está desligada.
+
+    `months` vem de RAW_RETENTION_MONTHS; vazio ou 0 mantém todos os dados brutos.
+    """
+    if months is None:
+        months = int(os.getenv('RAW_RETENTION_MONTHS') or '0')
+    if months < 0:
+        raise ValueError(f"RAW_RETENTION_MONTHS deve ser >= 0, recebido {months}")
+    if months == 0:
+        return None
+    return add_months(today or datetime.date.today(), -months)
+
+
+def list_partitions(conn, table):
+    """[(nome, limite superior exclusivo ou None para MAXVALUE)] na ordem das partições."""
+    rows = conn.execute(text("""
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM INFORMATION_SCHEMA.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :tabela AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+    """), {'tabela': table}).fetchall()
+    return [
+        (name, None if description == 'MAXVALUE' else datetime.date.fromisoformat(description.strip("'")))
+        for name, description in rows
+    ]
+
+
+def ensure_future_partitions(engine, table, ahead=None):
+    """Cria partições mensais até `ahead` meses depois do mês atual; devolve as criadas."""
+    ahead = int(os.getenv('PARTITION_MONTHS_AHEAD', '3')) if ahead is None else ahead
+    with engine.connect() as conn:
+        partitions = list_partitions(conn, table)
+    if not partitions or partitions[-1][0] != FUTURE_PARTITION:
+        logger.warning(f"{table} não existe ou não está particionada por data (aplique as migrações), nada a fazer")
+        return []
+
+    bounds = [bound for _, bound in partitions if bound is not None]
+    start = max(bounds) if bounds else datetime.date.today().replace(day=1)
+    target = add_months(datetime.date.today(), ahead + 1)
+
+    created = []
+    while start < target:
+        upper = add_months(start, 1)
+        created.append((f"p{start:%Y%m}", upper))
+        start = upper
+    if not created:
+        return []
+
+    definitions = ", ".join(f"PARTITION {name} VALUES LESS THAN ('{upper}')" for name, upper in created)
+    with engine.connect() as conn:
+        pending = conn.execute(text(f"SELECT 1 FROM {table} PARTITION ({FUTURE_PARTITION}) LIMIT 1")).first()
+    if pending:
+        logger.warning(f"{table}: {FUTURE_PARTITION} tem linhas, que serão copiadas para as partições novas (pode demorar)")
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {table} REORGANIZE PARTITION {FUTURE_PARTITION} INTO "
+            f"({definitions}, PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE))"
+        ))
+    logger.info(f"{table}: {len(created)} partições criadas ({created[0][0]} a {created[-1][0]})")
+    return [name for name, _ in created]
+
+
+def archive_partitions(engine, before, table='weather_raw'):
+    """Move para `<tabela>_arquivo_<partição>` as partições com todas as datas anteriores a `before`.
+
+    EXCHANGE PARTITION troca os dados sem copiar linha a linha; partições vazias
+    são apenas removidas. Devolve os nomes das partições arquivadas.
+    """
+    with engine.connect() as conn:
+        partitions = list_partitions(conn, table)
+    expired = [name for name, bound in partitions if bound is not None and bound <= before]
+    # mantém ao menos uma partição com limite, para a próxima criar os meses a partir dela
+    if expired and len(expired) == len([bound for _, bound in partitions if bound is not None]):
+        expired = expired[:-1]
+
+    archived = []
+    for name in expired:
+        archive = f"{table}_arquivo_{name}"
+        with engine.begin() as conn:
+            has_rows = conn.execute(text(f"SELECT 1 FROM {table} PARTITION ({name}) LIMIT 1")).first()
+            if has_rows:
+                conn.execute(text(f"CREATE TABLE {archive} LIKE {table}"))
+                conn.execute(text(f"ALTER TABLE {archive} REMOVE PARTITIONING"))
+                conn.execute(text(f"ALTER TABLE {table} EXCHANGE PARTITION {name} WITH TABLE {archive} WITHOUT VALIDATION"))
+            conn.execute(text(f"ALTER TABLE {table} DROP PARTITION {name}"))
+        archived.append(name)
+        logger.info(f"{table}: partição {name} " + (f"arquivada em {archive}" if has_rows else "vazia removida"))
+    return archived
+
+
+def maintain_partitions(engine, archive=False):
+    """Cria as partições futuras de todas as tabelas e, opcionalmente, arquiva os dados brutos antigos.
+
+    O corte do arquivamento é retention_cutoff (RAW_RETENTION_MONTHS meses antes do
+    mês atual), que avança com o tempo. O backfill também não procura lacunas antes
+    desse corte, então os meses arquivados não são baixados de novo.
+    """
+    for table in PARTITIONED_TABLES:
+        ensure_future_partitions(engine, table)
+    if archive:
+        before = retention_cutoff()
+        if before is None:
+            logger.warning("Arquivamento pedido mas RAW_RETENTION_MONTHS não definido (ou 0), nada arquivado")
+            return
+        logger.info(f"Arquivando partições dos dados brutos anteriores a {before}")
+        for table in ARCHIVED_TABLES:
+            archive_partitions(engine, before, table)
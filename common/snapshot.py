@@ -0,0 +1,191 @@
+"""Snapshot colunar (Parquet) de weather_daily publicado pelo ETL e lido pelo dashboard.
+
+Layout em disco::
+
+    <SNAPSHOT_DIR>/LATEST                      -> nome da versão mais recente
+    <SNAPSHOT_DIR>/v=<versão>/_manifest.json   -> regiões, meses, total de linhas e versão dos dados
+    <SNAPSHOT_DIR>/v=<versão>/year=YYYY/month=M/*.parquet
+
+Cada versão é escrita num diretório temporário e só fica visível quando LATEST é
+trocado, então leitores nunca enxergam um snapshot pela metade. O manifesto guarda o
+daily_loaded_at (etl_state) de que o snapshot foi gerado; current_snapshot só devolve
+o snapshot se ele ainda corresponde à última carga, senão o leitor volta ao MySQL.
+"""
+import datetime
+import json
+import logging
+import os
+import shutil
+
+import pandas as pd
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'snapshots', 'weather_daily')
+DAILY_COLUMNS = 'regiao, data, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica'
+# momento da última carga em weather_daily, gravado pela transformação (LOADED_KEY)
+DATA_VERSION_KEY = 'daily_loaded_at'
+
+
+def snapshot_dir():
+    return os.getenv('SNAPSHOT_DIR', DEFAULT_DIR)
+
+
+SCHEMA_FIELDS = [
+    ('regiao', 'dictionary'),
+    ('data', 'timestamp'),
+    ('temperatura_maxima', 'float32'),
+    ('temperatura_minima', 'float32'),
+    ('precipitacao_total', 'float32'),
+    ('amplitude_termica', 'float32'),
+    ('month_name', 'string')
+]
+
+
+def snapshot_schema():
+    import pyarrow as pa
+
+    types = {
+        'dictionary': pa.dictionary(pa.int32(), pa.string()),
+        'timestamp': pa.timestamp('ns'),
+        'float32': pa.float32(),
+        'string': pa.string()
+    }
+    return pa.schema([(name, types[kind]) for name, kind in SCHEMA_FIELDS])
+
+
+def read_month_chunks(engine, start, end, chunk_size):
+    """Linhas de weather_daily de um mês em blocos, por cursor do lado do servidor."""
+    query = text(f"""
+        SELECT {DAILY_COLUMNS} FROM weather_daily
+        WHERE data >= :inicio AND data < :fim
+        ORDER BY regiao, data
+    """)
+    with engine.connect().execution_options(stream_results=True) as conn:
+        yield from pd.read_sql(query, conn, params={'inicio': start, 'fim': end}, chunksize=chunk_size)
+
+
+def publish_snapshot(engine, directory=None, keep=None, chunk_size=None):
+    """Exporta weather_daily para uma nova versão do snapshot e devolve o caminho dela.
+
+    A tabela é lida mês a mês em blocos de SNAPSHOT_CHUNK_SIZE linhas e cada bloco vira
+    um row group no arquivo do mês, então a memória usada não cresce com o histórico.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    directory = directory or snapshot_dir()
+    keep = keep or int(os.getenv('SNAPSHOT_KEEP', '3'))
+    chunk_size = chunk_size or int(os.getenv('SNAPSHOT_CHUNK_SIZE', '50000'))
+    os.makedirs(directory, exist_ok=True)
+
+    with engine.connect() as conn:
+        # lido antes dos dados: uma carga durante a publicação deixa o snapshot marcado como antigo
+        data_version = conn.execute(
+            text("SELECT valor FROM etl_state WHERE chave = :chave"), {'chave': DATA_VERSION_KEY}
+        ).scalar()
+        months = [row[0] for row in conn.execute(text(
+            "SELECT DISTINCT DATE_FORMAT(data, '%Y-%m') FROM weather_daily ORDER BY 1"
+        ))]
+    if not months:
+        logger.warning("weather_daily vazia, snapshot não publicado")
+        return None
+
+    version = datetime.datetime.now().strftime('%Y%m%dT%H%M%S%f')
+    target = os.path.join(directory, f"v={version}")
+    staging = target + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+
+    schema = snapshot_schema()
+    rows = 0
+    regions = set()
+    for month_name in months:
+        start = datetime.date.fromisoformat(month_name + '-01')
+        end = (start + datetime.timedelta(days=32)).replace(day=1)
+        # mesmo layout de partições year=/month= que o dashboard filtra na leitura
+        partition = os.path.join(staging, f"year={start.year}", f"month={start.month}")
+        os.makedirs(partition)
+        with pq.ParquetWriter(os.path.join(partition, 'part-0.parquet'), schema, compression='zstd') as writer:
+            for df in read_month_chunks(engine, start, end, chunk_size):
+                df['data'] = pd.to_datetime(df['data'])
+                df['regiao'] = df['regiao'].astype('category')
+                df['month_name'] = month_name
+                writer.write_table(pa.Table.from_pandas(df, schema=schema, preserve_index=False))
+                rows += len(df)
+                regions.update(df['regiao'].cat.categories)
+
+    with open(os.path.join(staging, '_manifest.json'), 'w', encoding='utf-8') as handle:
+        json.dump({
+            'version': version,
+            'data_version': data_version,
+            'rows': rows,
+            'regions': sorted(regions),
+            'months': months
+        }, handle)
+    os.replace(staging, target)
+
+    # troca atômica do ponteiro para a versão nova
+    latest_tmp = os.path.join(directory, 'LATEST.tmp')
+    with open(latest_tmp, 'w', encoding='utf-8') as handle:
+        handle.write(f"v={version}")
+    os.replace(latest_tmp, os.path.join(directory, 'LATEST'))
+
+    # remove versões antigas além das `keep` mais recentes
+    versions = sorted(name for name in os.listdir(directory) if name.startswith('v=') and not name.endswith('.tmp'))
+    for name in versions[:-keep]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+    logger.info(f"Snapshot {version} publicado com {rows} linhas em {target}")
+    return target
+
+
+def latest_snapshot(directory=None):
+    """Caminho da versão mais recente, ou None se não houver snapshot publicado."""
+    directory = directory or snapshot_dir()
+    try:
+        with open(os.path.join(directory, 'LATEST'), encoding='utf-8') as handle:
+            path = os.path.join(directory, handle.read().strip())
+    except FileNotFoundError:
+        return None
+    return path if os.path.isdir(path) else None
+
+
+def current_snapshot(data_version, directory=None):
+    """Snapshot mais recente se ele foi gerado da carga `data_version`; senão None (ler do MySQL)."""
+    path = latest_snapshot(directory)
+    if path is None or data_version is None:
+        return None
+    try:
+        manifest = read_manifest(path)
+    except (OSError, ValueError):
+        return None
+    if manifest.get('data_version') != data_version:
+        logger.info(f"Snapshot {manifest.get('version')} desatualizado em relação à carga {data_version}, ignorado")
+        return None
+    return path
+
+
+def read_manifest(path):
+    with open(os.path.join(path, '_manifest.json'), encoding='utf-8') as handle:
+        return json.load(handle)
+
+
+def read_snapshot(path, regions=None, year=None, month=None):
+    """Lê do snapshot só as partições e regiões pedidas, com memory-map dos arquivos."""
+    import pyarrow.parquet as pq
+
+    filters = []
+    if year is not None:
+        filters.append(('year', '=', int(year)))
+    if month is not None:
+        filters.append(('month', '=', int(month)))
+    if regions is not None:
+        filters.append(('regiao', 'in', list(regions)))
+
+    table = pq.read_table(path, filters=filters or None, memory_map=True)
+    df = table.to_pandas()
+    df['regiao'] = df['regiao'].astype(str)
+    df['year'] = df['year'].astype(int)
+    df['month'] = df['month'].astype(int)
+    return df
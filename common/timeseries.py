@@ -0,0 +1,99 @@
+"""Redução de séries temporais para gráficos: escolha de resolução, LTTB e estatísticas de boxplot.
+
+Tudo roda no servidor, de modo que o que vai para o Plotly (e pelo websocket do
+Streamlit) tem tamanho limitado independentemente do tamanho do histórico.
+"""
+import datetime
+
+import numpy as np
+import pandas as pd
+
+RESOLUTIONS = ('daily', 'weekly', 'monthly')
+
+
+def bucket_count(start, end, resolution):
+    """Quantidade de períodos de `resolution` entre start e end (inclusive)."""
+    days = (end - start).days + 1
+    if resolution == 'daily':
+        return days
+    if resolution == 'weekly':
+        return days // 7 + 2
+    return (end.year - start.year) * 12 + end.month - start.month + 1
+
+
+def choose_resolution(start, end, series, max_points):
+    """Resolução mais fina em que `series` séries cabem em `max_points` pontos; senão mensal."""
+    for resolution in RESOLUTIONS:
+        if bucket_count(start, end, resolution) * max(1, series) <= max_points:
+            return resolution
+    return 'monthly'
+
+
+def month_bounds(start, end):
+    """Intervalo ampliado para meses completos (resolução mensal vem do rollup por mês)."""
+    first = start.replace(day=1)
+    last = (end.replace(day=1) + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+    return first, last
+
+
+def lttb(x, y, threshold):
+    """Índices dos pontos mantidos pelo Largest-Triangle-Three-Buckets.
+
+    Mantém o primeiro e o último ponto e, em cada balde intermediário, o ponto que
+    forma o maior triângulo com o ponto escolhido no balde anterior e a média do
+    próximo, preservando picos e vales da série.
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    bucket_size = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start = int(i * bucket_size) + 1
+        end = int((i + 1) * bucket_size) + 1
+        next_end = min(int((i + 2) * bucket_size) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+        area = np.abs(
+            (x[previous] - avg_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (avg_y - y[previous])
+        )
+        previous = start + int(np.argmax(area))
+        indices[i + 1] = previous
+    return indices
+
+
+def downsample(df, x, y, group, max_points):
+    """Aplica LTTB a cada série de `group` para que o total fique em até `max_points` pontos."""
+    df = df.dropna(subset=[y])
+    if len(df) <= max_points:
+        return df
+    groups = df[group].nunique()
+    threshold = max(3, max_points // max(1, groups))
+    parts = []
+    for _, series in df.sort_values(x).groupby(group, sort=False):
+        keep = lttb(series[x].astype('int64'), series[y], threshold)
+        parts.append(series.iloc[keep])
+    return pd.concat(parts, ignore_index=True)
+
+
+def box_stats(df, group, value):
+    """Quartis e cercas de Tukey (1,5 × IQR, limitadas aos extremos) por grupo.
+
+    Permite desenhar boxplots com go.Box(q1=..., median=..., ...) sem enviar os
+    pontos individuais ao navegador.
+    """
+    grouped = df.dropna(subset=[value]).groupby(group)[value]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'median', 'q3']
+    stats['min'] = grouped.min()
+    stats['max'] = grouped.max()
+    iqr = stats['q3'] - stats['q1']
+    stats['lowerfence'] = np.maximum(stats['min'], stats['q1'] - 1.5 * iqr)
+    stats['upperfence'] = np.minimum(stats['max'], stats['q3'] + 1.5 * iqr)
+    return stats.reset_index()
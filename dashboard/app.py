@@ -1,11 +1,19 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from sqlalchemy import create_engine, text
+import plotly.graph_objects as go
+from sqlalchemy import create_engine, text, bindparam
 from dotenv import load_dotenv
 import os
+import sys
 import datetime
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.export import estimate_size, export_daily
+from common.hourly import hourly_frame
+from common.snapshot import current_snapshot, read_manifest, read_snapshot
+from common.timeseries import box_stats, choose_resolution, downsample, month_bounds
+
 # Só carrega .env se rodando fora do Docker (ex: local)
 if not os.environ.get('RUNNING_IN_DOCKER'):
     load_dotenv()
@@ -71,17 +79,73 @@ st.markdown("""
 st.markdown('<div class="big-title">Clima DF — Painel</div>', unsafe_allow_html=True)
 st.markdown('<div class="subtitle">KPIs e análises por região e mês — selecione filtros no painel lateral.</div>', unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    # preferir a view base se existir
+# Cache por combinação de filtros: TTL e número máximo de entradas limitam a memória por processo
+CACHE_TTL = int(os.getenv('DASHBOARD_CACHE_TTL', '900'))
+CACHE_MAX_ENTRIES = int(os.getenv('DASHBOARD_CACHE_MAX_ENTRIES', '64'))
+# teto de pontos enviados por gráfico no modo intervalo (define a resolução e o LTTB)
+MAX_POINTS = int(os.getenv('DASHBOARD_MAX_POINTS', '2000'))
+BASE_COLUMNS = 'regiao, data, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica'
+DAILY_QUERIES = [
+    f'SELECT {BASE_COLUMNS} FROM weather_db.vw_weather_base WHERE regiao IN :regioes AND data >= :inicio AND data < :fim',
+    # só lê idx_daily_data_cover (data, regiao_id, métricas): partição do mês, sem acessar as linhas
+    '''SELECT r.nome AS regiao, d.data, d.temperatura_maxima, d.temperatura_minima, d.precipitacao_total, d.amplitude_termica
+       FROM weather_daily d JOIN dim_regiao r ON r.regiao_id = d.regiao_id
+       WHERE r.nome IN :regioes AND d.data >= :inicio AND d.data < :fim''',
+    f'SELECT {BASE_COLUMNS} FROM weather_daily WHERE regiao IN :regioes AND data >= :inicio AND data < :fim'
+]
+
+
+def read_first(queries, params):
+    """Executa a primeira consulta da lista que funcionar neste banco (views/migrações opcionais)."""
+    for position, sql in enumerate(queries):
+        query = text(sql).bindparams(bindparam('regioes', expanding=True))
+        try:
+            with engine.connect() as conn:
+                return pd.read_sql(query, conn, params=params)
+        except Exception:
+            if position == len(queries) - 1:
+                raise
+
+
+@st.cache_data(ttl=60)
+def data_version():
+    # momento da última carga em weather_daily gravado pelo ETL; muda a chave dos caches abaixo
     try:
-        query = text('SELECT regiao, data, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica FROM weather_db.vw_weather_base')
         with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
+            row = conn.execute(text("SELECT valor FROM etl_state WHERE chave = 'daily_loaded_at'")).fetchone()
+        return row[0] if row else None
     except Exception:
-        query = text('SELECT regiao, data, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica FROM weather_daily')
-        with engine.connect() as conn:
-            df = pd.read_sql(query, conn)
+        return None
+
+
+@st.cache_data(ttl=CACHE_TTL)
+def load_dimensions(version, snapshot):
+    if snapshot:
+        try:
+            manifest = read_manifest(snapshot)
+            return manifest['regions'], manifest['months']
+        except Exception:
+            pass
+    with engine.connect() as conn:
+        regions = [r[0] for r in conn.execute(text('SELECT DISTINCT regiao FROM weather_daily ORDER BY regiao'))]
+        months = [r[0] for r in conn.execute(text("SELECT DISTINCT DATE_FORMAT(data, '%Y-%m') FROM weather_daily ORDER BY 1"))]
+    return regions, months
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def load_data(regions, month_name, version, snapshot):
+    ano, mes = (int(p) for p in month_name.split('-'))
+    # snapshot Parquet publicado pelo ETL: lê só a partição do mês, sem tocar no MySQL
+    if snapshot:
+        try:
+            return read_snapshot(snapshot, regions=regions, year=ano, month=mes)
+        except Exception:
+            pass
+    inicio = datetime.date(ano, mes, 1)
+    fim = datetime.date(ano + mes // 12, mes % 12 + 1, 1)
+    params = {'regioes': list(regions), 'inicio': inicio, 'fim': fim}
+    # preferir a view base se existir; depois o índice de cobertura por data + dim_regiao (sql/migrations/005)
+    df = read_first(DAILY_QUERIES, params)
     # normalizar nomes de colunas para lowercase (unifica views e tabela)
     df.columns = [c.lower() for c in df.columns]
     df['data'] = pd.to_datetime(df['data'])
@@ -90,11 +154,308 @@ def load_data():
     df['month_name'] = df['data'].dt.strftime('%Y-%m')
     return df
 
-df = load_data()
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def load_kpis(regions, month_name, version):
+    # médias ponderadas pelos dias de cada região para combinar várias regiões
+    ano, mes = (int(p) for p in month_name.split('-'))
+    query = text("""
+        SELECT
+            SUM(dias) AS dias,
+            SUM(temperatura_maxima_media * dias) / SUM(dias) AS temperatura_maxima_media,
+            SUM(temperatura_minima_media * dias) / SUM(dias) AS temperatura_minima_media,
+            SUM(precipitacao_total) AS precipitacao_total,
+            SUM(amplitude_media * dias) / SUM(dias) AS amplitude_media,
+            SUM(dias_calor_extremo) AS dias_calor_extremo,
+            SUM(dias_frio_extremo) AS dias_frio_extremo,
+            SUM(dias_chuva_forte) AS dias_chuva_forte
+        FROM weather_monthly
+        WHERE regiao IN :regioes AND ano = :ano AND mes = :mes
+    """).bindparams(bindparam('regioes', expanding=True))
+    try:
+        with engine.connect() as conn:
+            row = conn.execute(query, {'regioes': list(regions), 'ano': ano, 'mes': mes}).mappings().fetchone()
+    except Exception:
+        return None
+    if not row or not row['dias']:
+        return None
+    return {k: (float(v) if k.startswith(('temperatura', 'precipitacao', 'amplitude')) else int(v)) for k, v in row.items()}
+
+
+# modo intervalo: agregados por período calculados no MySQL (diário/semanal) ou lidos do rollup (mensal)
+RESOLUTION_LABELS = {'daily': 'diária', 'weekly': 'semanal', 'monthly': 'mensal'}
+RANGE_SOURCES = [
+    # índice de cobertura + dim_regiao (sql/migrations/005); sem a migração, a tabela direto
+    ('r.nome', 'weather_daily d JOIN dim_regiao r ON r.regiao_id = d.regiao_id'),
+    ('d.regiao', 'weather_daily d')
+]
+RANGE_SELECT = {
+    'daily': """{regiao} AS regiao, d.data AS periodo, 1 AS dias, d.temperatura_maxima, d.temperatura_minima,
+                d.precipitacao_total, d.amplitude_termica""",
+    'weekly': """{regiao} AS regiao, DATE_SUB(d.data, INTERVAL WEEKDAY(d.data) DAY) AS periodo, COUNT(*) AS dias,
+                 AVG(d.temperatura_maxima) AS temperatura_maxima, AVG(d.temperatura_minima) AS temperatura_minima,
+                 SUM(d.precipitacao_total) AS precipitacao_total, AVG(d.amplitude_termica) AS amplitude_termica"""
+}
+MONTHLY_RANGE_QUERY = """
+    SELECT regiao, ano, mes, dias,
+           temperatura_maxima_media AS temperatura_maxima, temperatura_minima_media AS temperatura_minima,
+           precipitacao_total, amplitude_media AS amplitude_termica
+    FROM weather_monthly
+    WHERE regiao IN :regioes AND ano BETWEEN :ano_inicio AND :ano_fim AND ano * 100 + mes BETWEEN :mes_inicio AND :mes_fim
+"""
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def load_range(regions, start, end, resolution, version):
+    """Uma linha por região e período na resolução pedida, com o número de dias de cada período."""
+    if resolution == 'monthly':
+        df = read_first([MONTHLY_RANGE_QUERY], {
+            'regioes': list(regions),
+            'ano_inicio': start.year, 'ano_fim': end.year,
+            'mes_inicio': start.year * 100 + start.month, 'mes_fim': end.year * 100 + end.month
+        })
+        df['periodo'] = pd.to_datetime(pd.DataFrame({'year': df['ano'], 'month': df['mes'], 'day': 1}))
+        df = df.drop(columns=['ano', 'mes'])
+    else:
+        queries = []
+        for regiao, source in RANGE_SOURCES:
+            sql = f"SELECT {RANGE_SELECT[resolution].format(regiao=regiao)} FROM {source} " \
+                  f"WHERE {regiao} IN :regioes AND d.data >= :inicio AND d.data < :fim"
+            if resolution == 'weekly':
+                sql += f" GROUP BY {regiao}, periodo"
+            queries.append(sql)
+        df = read_first(queries, {'regioes': list(regions), 'inicio': start, 'fim': end + datetime.timedelta(days=1)})
+        df['periodo'] = pd.to_datetime(df['periodo'])
+    for column in ('temperatura_maxima', 'temperatura_minima', 'precipitacao_total', 'amplitude_termica'):
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df['dias'] = df['dias'].astype(int)
+    return df.sort_values(['regiao', 'periodo'], ignore_index=True)
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def load_range_box(regions, start, end, version):
+    """Quartis diários da temperatura máxima por região; só as estatísticas vão para o gráfico."""
+    queries = [
+        f"SELECT {regiao} AS regiao, d.temperatura_maxima FROM {source} "
+        f"WHERE {regiao} IN :regioes AND d.data >= :inicio AND d.data < :fim"
+        for regiao, source in RANGE_SOURCES
+    ]
+    df = read_first(queries, {'regioes': list(regions), 'inicio': start, 'fim': end + datetime.timedelta(days=1)})
+    return box_stats(df, 'regiao', 'temperatura_maxima')
+
+
+@st.cache_data(ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES)
+def load_hourly(regions, day, version):
+    """24 horas de um dia por região, de weather_hourly_raw (vazio se a extração horária estiver desligada)."""
+    # chave primária (regiao_id, data), sql/migrations/008
+    query = text("""
+        SELECT regiao, temperatura, precipitacao FROM weather_hourly_raw
+        WHERE regiao_id IN (SELECT regiao_id FROM dim_regiao WHERE nome IN :regioes) AND data = :data
+    """).bindparams(bindparam('regioes', expanding=True))
+    try:
+        with engine.connect() as conn:
+            df = pd.read_sql(query, conn, params={'regioes': list(regions), 'data': day})
+    except Exception:
+        # tabela ainda não criada (sql/migrations/006)
+        return pd.DataFrame()
+    # só as linhas do dia (2 × 96 bytes por região) saem do banco; o desempacotamento é vetorizado
+    return hourly_frame(df) if not df.empty else df
+
+
+def region_summary(data):
+    """Resumo por região com médias ponderadas pelos dias de cada período."""
+    weighted = data.assign(
+        temp_max_media=data['temperatura_maxima'] * data['dias'],
+        temp_min_media=data['temperatura_minima'] * data['dias'],
+        amplitude_media=data['amplitude_termica'] * data['dias']
+    ).groupby('regiao').agg(
+        dias=('dias', 'sum'),
+        temp_max_media=('temp_max_media', 'sum'),
+        temp_min_media=('temp_min_media', 'sum'),
+        precipitacao_total=('precipitacao_total', 'sum'),
+        amplitude_media=('amplitude_media', 'sum')
+    )
+    for column in ('temp_max_media', 'temp_min_media', 'amplitude_media'):
+        weighted[column] = weighted[column] / weighted['dias']
+    return weighted.reset_index()
+
+
+# o download_button do Streamlit carrega o arquivo inteiro na memória do servidor (e o envia
+# pelo websocket); exportações acima deste tamanho são recusadas antes de serem geradas
+EXPORT_MAX_DOWNLOAD_MB = float(os.getenv('EXPORT_MAX_DOWNLOAD_MB', '200'))
+EXPORT_MIME = {'.csv': 'text/csv', '.parquet': 'application/vnd.apache.parquet'}
+
+
+def export_panel(regions, start, end, version, key):
+    """Exportação de weather_daily só quando pedida: lida do banco em blocos e gravada em disco."""
+    st.markdown('---')
+    st.subheader('Exportar dados diários')
+    c1, c2 = st.columns([1, 2])
+    fmt = c1.selectbox('Formato', ['csv', 'parquet'], format_func=lambda f: {'csv': 'CSV', 'parquet': 'Parquet (zstd)'}[f], key=f'{key}_formato')
+    filters = (tuple(sorted(regions)), str(start), str(end), fmt, version)
+    exports = st.session_state.setdefault('exports', {})
+    if c2.button(f'Gerar arquivo ({start:%d/%m/%Y} a {end:%d/%m/%Y})', key=f'{key}_gerar'):
+        rows, estimated = estimate_size(engine, regions, start, end, fmt)
+        if estimated / 1024 / 1024 > EXPORT_MAX_DOWNLOAD_MB:
+            st.warning(
+                f'A exportação teria {rows} linhas (cerca de {estimated / 1024 / 1024:.0f} MB), acima do limite '
+                f'de download ({EXPORT_MAX_DOWNLOAD_MB:.0f} MB). Reduza o intervalo ou as regiões.'
+            )
+            exports.pop(filters, None)
+        else:
+            with st.spinner('Gerando exportação...'):
+                exports[filters] = export_daily(engine, regions, start, end, fmt, version=version)
+
+    path = exports.get(filters)
+    if not path or not os.path.exists(path):
+        return
+    name = os.path.basename(path)
+    size = os.path.getsize(path) / 1024 / 1024
+    if size > EXPORT_MAX_DOWNLOAD_MB:
+        # a estimativa errou para baixo: o arquivo não é carregado na memória do servidor
+        st.warning(f'{name} tem {size:.1f} MB, acima do limite de download ({EXPORT_MAX_DOWNLOAD_MB:.0f} MB). '
+                   'Reduza o intervalo ou as regiões.')
+        return
+    # o arquivo só é lido para a memória quando o download é pedido, e só nessa execução;
+    # nas demais o painel mostra apenas o botão que o prepara
+    if not st.button(f'Preparar download de {name} ({size:.1f} MB)', key=f'{key}_preparar'):
+        return
+    with open(path, 'rb') as handle:
+        st.download_button(f'Baixar {name}', handle.read(), file_name=name,
+                           mime=EXPORT_MIME[os.path.splitext(name)[1]], key=f'{key}_baixar')
+
+
+def hourly_panel(regions, days, version):
+    """Detalhe horário de um dia do mês escolhido (temperatura e precipitação hora a hora)."""
+    st.markdown('---')
+    st.subheader('Detalhe horário')
+    day = st.selectbox('Dia', days, index=len(days) - 1, format_func=lambda d: d.strftime('%d/%m/%Y'), key='hora_dia')
+    hourly = load_hourly(regions, day, version)
+    if hourly.empty:
+        st.caption('Sem dados horários para este dia — habilite a extração horária com EXTRACT_HOURLY=1.')
+        return
+    c1, c2 = st.columns(2)
+    with c1:
+        fig_temp = px.line(hourly, x='hora', y='temperatura', color='regiao', markers=True,
+                           labels={'hora': 'Hora', 'temperatura': 'Temperatura (°C)'}, template='plotly_white')
+        fig_temp.update_layout(legend_title_text='Região')
+        st.plotly_chart(fig_temp, use_container_width=True)
+    with c2:
+        fig_prec = px.bar(hourly, x='hora', y='precipitacao', color='regiao', barmode='group',
+                          labels={'hora': 'Hora', 'precipitacao': 'Precipitação (mm)'}, template='plotly_white')
+        fig_prec.update_layout(legend_title_text='Região')
+        st.plotly_chart(fig_prec, use_container_width=True)
+
+
+def show_map(map_df):
+    """Mapa da temperatura máxima média (colunas regiao, temperatura_media) com coordenadas aproximadas."""
+    try:
+        map_df = map_df.copy()
+        # adicionar lat/lon
+        lats, lons = [], []
+        for r in map_df['regiao']:
+            coord = REGION_COORDS.get(r)
+            if coord:
+                lats.append(coord[0])
+                lons.append(coord[1])
+            else:
+                lats.append(None)
+                lons.append(None)
+        map_df['lat'] = lats
+        map_df['lon'] = lons
+        map_df = map_df.dropna(subset=['lat','lon'])
+
+        if not map_df.empty:
+            st.subheader('Mapa — Temperatura Máxima Média')
+            fig_map = px.scatter_mapbox(map_df, lat='lat', lon='lon', size='temperatura_media', color='temperatura_media',
+                                       hover_name='regiao', hover_data={'lat':False,'lon':False,'temperatura_media':':.1f'},
+                                       color_continuous_scale='Turbo', size_max=18, zoom=10)
+            fig_map.update_layout(mapbox_style='open-street-map', margin={'r':0,'t':0,'l':0,'b':0})
+            st.plotly_chart(fig_map, use_container_width=True)
+    except Exception:
+        pass
+
+
+def render_range(selected_regions, start, end, version):
+    """Modo intervalo: resolução escolhida pelo tamanho do intervalo e no máximo MAX_POINTS pontos por gráfico."""
+    regions_key = tuple(sorted(selected_regions))
+    resolution = choose_resolution(start, end, len(regions_key), MAX_POINTS)
+    if resolution == 'monthly':
+        start, end = month_bounds(start, end)
+    data = load_range(regions_key, start, end, resolution, version)
+    if data.empty:
+        st.warning('Nenhum dado para os filtros selecionados.')
+        return
+
+    summary = region_summary(data)
+    dias = summary['dias'].sum()
+    k1, k2, k3, k4 = st.columns([1.5,1,1,1])
+    with k1:
+        st.markdown(f'**Resumo — {start:%d/%m/%Y} a {end:%d/%m/%Y}**')
+        st.markdown(f"**{int(data.groupby('regiao')['dias'].sum().max())} dias**")
+    k2.metric('Temp Máx (média)', f"{(summary['temp_max_media'] * summary['dias']).sum() / dias:.1f} °C")
+    k3.metric('Temp Mín (média)', f"{(summary['temp_min_media'] * summary['dias']).sum() / dias:.1f} °C")
+    k4.metric('Precipitação (total)', f"{summary['precipitacao_total'].sum():.1f} mm")
+
+    line = downsample(data, 'periodo', 'temperatura_maxima', 'regiao', MAX_POINTS)
+    caption = f"Resolução {RESOLUTION_LABELS[resolution]}: {len(data)} pontos agregados"
+    if len(line) < len(data):
+        caption += f", {len(line)} exibidos na série (LTTB)"
+    if resolution == 'monthly':
+        caption += " — período ajustado para meses completos (rollup mensal)"
+    st.caption(caption)
+
+    st.markdown('---')
+    col1, col2 = st.columns([2,1])
+    with col1:
+        st.subheader('Séries temporais — Temperatura Máxima')
+        fig_ts = px.line(line, x='periodo', y='temperatura_maxima', color='regiao', labels={'periodo':'Data','temperatura_maxima':'Temp Máx (°C)'}, template='plotly_white')
+        fig_ts.update_layout(legend_title_text='Região')
+        st.plotly_chart(fig_ts, use_container_width=True)
+
+        st.subheader(f'Precipitação por período ({RESOLUTION_LABELS[resolution]})')
+        if len(data) <= MAX_POINTS:
+            fig_bar = px.bar(data, x='periodo', y='precipitacao_total', color='regiao', labels={'periodo':'Data','precipitacao_total':'Precipitação (mm)'}, template='plotly_white')
+        else:
+            # barras demais para uma por região: média das regiões selecionadas em cada período
+            bars = data.groupby('periodo', as_index=False)['precipitacao_total'].mean()
+            fig_bar = px.bar(bars, x='periodo', y='precipitacao_total', labels={'periodo':'Data','precipitacao_total':'Precipitação média das regiões (mm)'}, template='plotly_white')
+        st.plotly_chart(fig_bar, use_container_width=True)
+
+    with col2:
+        st.subheader('Distribuição de Temperaturas')
+        stats = load_range_box(regions_key, start, end, version)
+        fig_box = go.Figure(go.Box(
+            x=stats['regiao'], q1=stats['q1'], median=stats['median'], q3=stats['q3'],
+            lowerfence=stats['lowerfence'], upperfence=stats['upperfence'], name='Temp Máx (°C)'
+        ))
+        fig_box.update_layout(template='plotly_white', yaxis_title='Temp Máx (°C)', showlegend=False)
+        st.plotly_chart(fig_box, use_container_width=True)
+
+        st.subheader('Resumo por Região')
+        st.dataframe(summary.style.format({
+            'temp_max_media':'{:.1f}',
+            'temp_min_media':'{:.1f}',
+            'precipitacao_total':'{:.1f}',
+            'amplitude_media':'{:.1f}'
+        }))
+
+    show_map(summary.rename(columns={'temp_max_media': 'temperatura_media'})[['regiao', 'temperatura_media']])
+
+    export_panel(regions_key, start, end, version, 'intervalo')
+
+
+version = data_version()
+# só usa o snapshot gerado da última carga; um snapshot antigo (publicação falhou ou desligada)
+# daria números diferentes dos KPIs de weather_monthly
+snapshot = current_snapshot(version)
+regions, all_months = load_dimensions(version, snapshot)
+
+if not regions:
+    st.warning('Nenhum dado disponível em weather_daily.')
+    st.stop()
 
 # Sidebar filters
 st.sidebar.header('Filtros')
-regions = sorted(df['regiao'].unique())
 # Garantir valor inicial sem sobrescrever após widget criado
 st.session_state.setdefault('selected_regions', regions[:3])
 
@@ -105,59 +466,47 @@ def _select_all():
 
 st.sidebar.button('Selecionar todas', on_click=_select_all)
 
-years = sorted(df['year'].unique())
+view_mode = st.sidebar.radio('Período', ['Mês', 'Intervalo de datas'], horizontal=True)
+if view_mode == 'Intervalo de datas':
+    first_day = datetime.date.fromisoformat(all_months[0] + '-01')
+    last_day = month_bounds(first_day, datetime.date.fromisoformat(all_months[-1] + '-01'))[1]
+    picked = st.sidebar.date_input(
+        'Intervalo', value=(max(first_day, last_day - datetime.timedelta(days=364)), last_day),
+        min_value=first_day, max_value=last_day
+    )
+    if not isinstance(picked, (tuple, list)) or len(picked) != 2:
+        st.info('Selecione a data inicial e a final.')
+    elif not selected_regions:
+        st.warning('Nenhum dado para os filtros selecionados.')
+    else:
+        render_range(selected_regions, picked[0], picked[1], version)
+    st.stop()
+
+years = sorted({int(m.split('-')[0]) for m in all_months})
 selected_year = st.sidebar.selectbox('Ano', years, index=len(years)-1)
 
 # usar month_name único (ano-mês) para evitar ambiguidade
-month_options = sorted(df[df['year']==selected_year]['month_name'].unique())
+month_options = [m for m in all_months if int(m.split('-')[0]) == selected_year]
 selected_month_name = st.sidebar.selectbox('Mês (Ano-Mês)', month_options, index=len(month_options)-1)
 
-# filtrar
-filtered = df[(df['regiao'].isin(selected_regions)) & (df['month_name'] == selected_month_name)]
+# filtrar no banco: só a região e o mês selecionados chegam ao pandas
+if selected_regions:
+    filtered = load_data(tuple(sorted(selected_regions)), selected_month_name, version, snapshot)
+else:
+    filtered = pd.DataFrame()
 
 if filtered.empty:
     st.warning('Nenhum dado para os filtros selecionados.')
 else:
-    # Se um único bairro selecionado, buscar KPIs nas views pré-calculadas
-    single_region = len(selected_regions) == 1
-    kpi_from_views = None
-    if single_region:
-        reg = selected_regions[0]
-        ano = int(selected_month_name.split('-')[0])
-        mes = int(selected_month_name.split('-')[1])
-        try:
-            with engine.connect() as conn:
-                kv = conn.execute(text('SELECT * FROM weather_db.vw_kpi_dias_extremos WHERE regiao = :r AND ano = :a'), {'r': reg, 'a': ano}).fetchone()
-                ka = conn.execute(text('SELECT * FROM weather_db.vw_kpi_amplitude_media WHERE regiao = :r AND ano = :a AND mes = :m'), {'r': reg, 'a': ano, 'm': mes}).fetchone()
-                kt = conn.execute(text('SELECT * FROM weather_db.vw_kpi_temp_media_mensal WHERE regiao = :r AND ano = :a AND mes = :m'), {'r': reg, 'a': ano, 'm': mes}).fetchone()
-                kp = conn.execute(text('SELECT * FROM weather_db.vw_kpi_precipitacao_mensal WHERE regiao = :r AND ano = :a AND mes = :m'), {'r': reg, 'a': ano, 'm': mes}).fetchone()
-                kpi_from_views = {'dias_extremos': kv, 'amplitude_media': ka, 'temp_media_mensal': kt, 'precipitacao_mensal': kp}
-        except Exception:
-            kpi_from_views = None
-
-    # calcular KPIs preferindo views quando disponíveis
-    def first_numeric_from_row(row):
-        if not row:
-            return None
-        try:
-            d = dict(row.items())
-        except Exception:
-            return None
-        for v in d.values():
-            if isinstance(v, (int, float)):
-                return float(v)
-        return None
-
-    if kpi_from_views and kpi_from_views.get('temp_media_mensal'):
-        temp_val = first_numeric_from_row(kpi_from_views['temp_media_mensal'])
-        temp_med = temp_val if temp_val is not None else filtered.get('temperatura_maxima', filtered.get('temperatura_maximo', filtered.columns)).mean() if False else filtered['temperatura_maxima'].mean()
+    # KPIs do mês numa única consulta indexada ao rollup mensal mantido pelo ETL
+    kpis = load_kpis(tuple(sorted(selected_regions)), selected_month_name, version)
+    if kpis is not None:
+        temp_med = kpis['temperatura_maxima_media']
+        temp_min_med = kpis['temperatura_minima_media']
+        precip_total = kpis['precipitacao_total']
     else:
         temp_med = filtered['temperatura_maxima'].mean()
-
-    if kpi_from_views and kpi_from_views.get('precipitacao_mensal'):
-        precip_val = first_numeric_from_row(kpi_from_views['precipitacao_mensal'])
-        precip_total = precip_val if precip_val is not None else filtered['precipitacao_total'].sum()
-    else:
+        temp_min_med = filtered['temperatura_minima'].mean()
         precip_total = filtered['precipitacao_total'].sum()
 
     # KPIs estilizados
@@ -166,8 +515,13 @@ else:
         st.markdown('**Resumo — ' + selected_month_name + '**')
         st.markdown(f"**{int(filtered['data'].nunique())} dias**")
     k2.metric('Temp Máx (média)', f"{temp_med:.1f} °C")
-    k3.metric('Temp Mín (média)', f"{filtered['temperatura_minima'].mean():.1f} °C")
+    k3.metric('Temp Mín (média)', f"{temp_min_med:.1f} °C")
     k4.metric('Precipitação (total)', f"{precip_total:.1f} mm")
+    if kpis is not None:
+        st.caption(
+            f"Dias extremos (soma das regiões): {kpis['dias_calor_extremo']} de calor, "
+            f"{kpis['dias_frio_extremo']} de frio, {kpis['dias_chuva_forte']} de chuva forte"
+        )
 
     # Layout para gráficos principais
     st.markdown('---')
@@ -202,33 +556,12 @@ else:
             'amplitude_media':'{:.1f}'
         }))
 
-    # Export
-    csv = filtered.to_csv(index=False)
-    st.download_button('Exportar CSV (filtro atual)', csv, file_name=f'clima_{selected_month_name}.csv')
-
     # Mapa de temperatura média — usar coordenadas aproximadas
-    try:
-        map_df = filtered.groupby('regiao', as_index=False).agg(temperatura_media=('temperatura_maxima','mean'))
-        # adicionar lat/lon
-        lats, lons = [], []
-        for r in map_df['regiao']:
-            coord = REGION_COORDS.get(r)
-            if coord:
-                lats.append(coord[0])
-                lons.append(coord[1])
-            else:
-                lats.append(None)
-                lons.append(None)
-        map_df['lat'] = lats
-        map_df['lon'] = lons
-        map_df = map_df.dropna(subset=['lat','lon'])
+    show_map(filtered.groupby('regiao', as_index=False).agg(temperatura_media=('temperatura_maxima','mean')))
 
-        if not map_df.empty:
-            st.subheader('Mapa — Temperatura Máxima Média')
-            fig_map = px.scatter_mapbox(map_df, lat='lat', lon='lon', size='temperatura_media', color='temperatura_media',
-                                       hover_name='regiao', hover_data={'lat':False,'lon':False,'temperatura_media':':.1f'},
-                                       color_continuous_scale='Turbo', size_max=18, zoom=10)
-            fig_map.update_layout(mapbox_style='open-street-map', margin={'r':0,'t':0,'l':0,'b':0})
-            st.plotly_chart(fig_map, use_container_width=True)
-    except Exception:
-        pass
+    # Drill-down horário de um dia do mês (tabela weather_hourly_raw, opcional)
+    hourly_panel(tuple(sorted(selected_regions)), sorted(filtered['data'].dt.date.unique()), version)
+
+    # Export sob demanda (nada é gerado nos reruns sem clique)
+    month_start = datetime.date.fromisoformat(selected_month_name + '-01')
+    export_panel(tuple(sorted(selected_regions)), month_start, month_bounds(month_start, month_start)[1], version, 'mes')
@@ -3,11 +3,11 @@
 
 set -e
 
-# Write cron job: run ETL at 06:00 America/Sao_Paulo daily
+# Write cron job: the scheduler runs the whole ETL graph (backfill -> forecast -> transform -> snapshot)
+# at 06:00 America/Sao_Paulo daily; dependencies, locking and retries live in scheduler/run_scheduler.py
 cat > /etc/cron.d/etl-cron <<'CRON'
 # m h  dom mon dow user  command
-0 6 * * * root cd /app && /usr/local/bin/python ingestion/extract_weather.py historical > /var/log/etl_historical.log 2>&1
-0 6 * * * root cd /app && /usr/local/bin/python ingestion/extract_weather.py && /usr/local/bin/python transform/transform_weather.py >> /var/log/etl.log 2>&1
+0 6 * * * root cd /app && /usr/local/bin/python scheduler/run_scheduler.py >> /var/log/etl.log 2>&1
 CRON
 
 chmod 0644 /etc/cron.d/etl-cron
@@ -16,5 +16,11 @@ crontab /etc/cron.d/etl-cron
 # Ensure log dir
 mkdir -p /var/log
 
+# Apply pending schema migrations and create upcoming partitions before any ETL run
+(cd /app && /usr/local/bin/python tools/migrate.py >> /var/log/etl.log 2>&1) || echo "Migrations failed, see /var/log/etl.log"
+
+# Catch-up: if the container was down at 06:00, run the missed ETL now (no-op if the last run is recent)
+(cd /app && /usr/local/bin/python scheduler/run_scheduler.py --catch-up >> /var/log/etl.log 2>&1) &
+
 echo "Starting cron..."
 cron -f
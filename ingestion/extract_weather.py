@@ -1,167 +1,529 @@
 import requests
 import json
 import logging
-from sqlalchemy import create_engine, text
+import sys
+from sqlalchemy import text
 from dotenv import load_dotenv
 import os
 import datetime
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 import time
+import queue
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from sqlalchemy.exc import OperationalError
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.bulk_loader import bulk_upsert
+from common import metrics
+from common.db import create_etl_engine
+from common.hourly import pack_days
+from common.partitions import retention_cutoff
+from ingestion.http_cache import ResponseCache
+
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def extract_weather(historical=False):
+# Regiões administrativas de Brasília (DF) com coordenadas aproximadas
+REGIONS = [
+    {"name": "Plano Piloto", "lat": -15.7833, "lon": -47.9167},
+    {"name": "Asa Norte", "lat": -15.7633, "lon": -47.8833},
+    {"name": "Asa Sul", "lat": -15.8067, "lon": -47.8833},
+    {"name": "Taguatinga", "lat": -15.8333, "lon": -48.0667},
+    {"name": "Ceilândia", "lat": -15.8167, "lon": -48.1167},
+    {"name": "Samambaia", "lat": -15.8667, "lon": -48.0833},
+    {"name": "Sobradinho", "lat": -15.65, "lon": -47.7833},
+    {"name": "Planaltina", "lat": -15.6167, "lon": -47.65},
+    {"name": "Gama", "lat": -16.0167, "lon": -48.0667},
+    {"name": "Guará", "lat": -15.8167, "lon": -47.9833},
+    {"name": "Núcleo Bandeirante", "lat": -15.8667, "lon": -47.9667},
+    {"name": "Paranoá", "lat": -15.7667, "lon": -47.7833},
+    {"name": "Itapoã", "lat": -15.75, "lon": -47.7667},
+    {"name": "Jardim Botânico", "lat": -15.8667, "lon": -47.8},
+    {"name": "Lago Sul", "lat": -15.8667, "lon": -47.8667},
+    {"name": "Lago Norte", "lat": -15.7167, "lon": -47.8833},
+    {"name": "Candangolândia", "lat": -15.85, "lon": -47.95},
+    {"name": "Varjão", "lat": -15.7167, "lon": -47.8833},
+    {"name": "SIA", "lat": -15.8, "lon": -47.9667},
+    {"name": "Sudoeste", "lat": -15.7833, "lon": -47.9167},
+    {"name": "Santa Maria", "lat": -16.0167, "lon": -47.9833},
+    {"name": "São Sebastião", "lat": -15.9, "lon": -47.7667},
+    {"name": "Recanto das Emas", "lat": -15.9167, "lon": -48.0667},
+    {"name": "Riacho Fundo", "lat": -15.8833, "lon": -48.0167},
+    {"name": "Riacho Fundo II", "lat": -15.9, "lon": -48.0333},
+    {"name": "Estrutural", "lat": -15.7833, "lon": -47.9833},
+    {"name": "Vicente Pires", "lat": -15.8, "lon": -48.0333},
+    {"name": "Águas Claras", "lat": -15.8333, "lon": -48.0333},
+    {"name": "Arniqueira", "lat": -15.85, "lon": -47.9667},
+    {"name": "Brazlândia", "lat": -15.6667, "lon": -48.2},
+    {"name": "Cruzeiro", "lat": -15.7833, "lon": -47.9333},
+    {"name": "Fercal", "lat": -15.6, "lon": -47.8667},
+    {"name": "Park Way", "lat": -15.9, "lon": -47.8167},
+    {"name": "SCIA", "lat": -15.7833, "lon": -47.9667},
+    {"name": "Sobradinho II", "lat": -15.6333, "lon": -47.8167}
+]
+
+FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+DAILY_VARIABLES = "temperature_2m_max,temperature_2m_min,precipitation_sum"
+# modo horário opcional (EXTRACT_HOURLY / --hourly), gravado em weather_hourly_raw
+HOURLY_VARIABLES = "temperature_2m,precipitation"
+HISTORY_START = "2025-01-01"
+WATERMARK_PREFIX = "backfill_watermark:"
+# dias até a API histórica consolidar um dado; intervalos encerrados antes disso não mudam mais
+ARCHIVE_FINAL_DAYS = 5
+
+
+class TokenBucket:
+    """Rate limiter compartilhado entre threads: `rate` requisições/s com rajadas de até `capacity`."""
+
+    def __init__(self, rate, capacity=1):
+        if float(rate) <= 0:
+            raise ValueError(f"RATE_LIMIT_PER_SEC precisa ser maior que zero (recebido {rate}); use 0 só para desligar o limite")
+        if float(capacity) < 1:
+            raise ValueError(f"RATE_LIMIT_BURST precisa ser pelo menos 1 (recebido {capacity})")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+
+def plan_points(regions, precision=2):
+    """Agrupa regiões com as mesmas coordenadas (arredondadas) num único ponto de busca.
+
+    Cada ponto carrega em 'names' todas as regiões que ele representa, para que a
+    resposta seja replicada para cada uma delas.
+    """
+    points = {}
+    for region in regions:
+        key = (round(region['lat'], precision), round(region['lon'], precision))
+        if key in points:
+            points[key]['names'].append(region['name'])
+        else:
+            points[key] = {'name': region['name'], 'lat': region['lat'], 'lon': region['lon'], 'names': [region['name']]}
+    return list(points.values())
+
+
+def cache_ttl(start_date, end_date):
+    """Validade da resposta em cache: None (permanente) para intervalos históricos já consolidados."""
+    if start_date and end_date and end_date <= datetime.date.today() - datetime.timedelta(days=ARCHIVE_FINAL_DAYS):
+        return None
+    return int(os.getenv('HTTP_CACHE_TTL_SECONDS', '3600'))
+
+
+def build_url(batch, start_date=None, end_date=None, hourly=False):
+    # A API aceita listas de coordenadas separadas por vírgula (uma localidade por par lat/lon)
+    latitudes = ",".join(str(region['lat']) for region in batch)
+    longitudes = ",".join(str(region['lon']) for region in batch)
+    variables = f"daily={DAILY_VARIABLES}" + (f"&hourly={HOURLY_VARIABLES}" if hourly else "")
+    if start_date:
+        # API histórica para backfill
+        end_date = end_date or datetime.date.today()
+        return f"{os.getenv('OPEN_METEO_ARCHIVE_URL', ARCHIVE_URL)}?latitude={latitudes}&longitude={longitudes}&start_date={start_date}&end_date={end_date}&{variables}&timezone=America/Sao_Paulo"
+    # API de forecast para operação normal
+    return f"{os.getenv('OPEN_METEO_FORECAST_URL', FORECAST_URL)}?latitude={latitudes}&longitude={longitudes}&{variables}&timezone=America/Sao_Paulo"
+
+
+def fetch_batch(session, job, limiter=None, cache=None, hourly=False):
+    """Busca um lote de pontos numa única requisição e devolve {nome da região: resposta da localidade}.
+
+    A resposta de cada localidade traz o bloco 'daily' e, com hourly=True, o bloco 'hourly'.
+    """
+    batch, start_date, end_date = job
+    url = build_url(batch, start_date, end_date, hourly)
+    data = cache.get(url) if cache else None
+    if data is not None:
+        metrics.incr('http_cache_hits')
+    else:
+        if limiter:
+            # diminui probabilidade de throttling na API
+            with metrics.timer('rate_limit_wait'):
+                limiter.acquire()
+        label = batch[0]['name'] if len(batch) == 1 else f"{batch[0]['name']} +{len(batch) - 1}"
+        metrics.incr('http_requests')
+        with metrics.timer('http_fetch', label):
+            response = session.get(url, timeout=15 + 5 * (len(batch) - 1))
+            count_http_retries(response)
+            response.raise_for_status()  # Levanta erro para status != 200
+            data = response.json()
+
+        # Com uma coordenada a API devolve um objeto; com várias, uma lista na mesma ordem da requisição
+        if isinstance(data, dict):
+            data = [data]
+        if len(data) != len(batch):
+            raise ValueError(f"API devolveu {len(data)} localidades para um lote de {len(batch)}")
+        if cache:
+            cache.set(url, data, ttl=cache_ttl(start_date, end_date))
+
+    return {
+        name: item
+        for point, item in zip(batch, data)
+        for name in point.get('names', [point['name']])
+    }
+
+
+def count_http_retries(response):
+    # tentativas refeitas pelo Retry do urllib3 antes desta resposta (429/5xx)
+    retries = getattr(response.raw, 'retries', None)
+    for attempt in getattr(retries, 'history', ()):
+        metrics.incr('http_retries')
+        if attempt.status == 429:
+            metrics.incr('http_429')
+
+
+def fetch_regions(session, job, limiter=None, cache=None, hourly=False):
+    """Busca um lote e, se a chamada agregada falhar, refaz ponto a ponto."""
+    batch, start_date, end_date = job
+    try:
+        return fetch_batch(session, job, limiter, cache, hourly)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        metrics.incr('http_errors')
+        if len(batch) == 1:
+            logger.error(f"Erro na requisição para {batch[0]['name']}: {e}")
+            metrics.incr('failures', len(batch[0].get('names', [batch[0]['name']])))
+            return {}
+        metrics.incr('batch_fallbacks')
+        logger.warning(f"Falha no lote de {len(batch)} regiões, recorrendo a chamadas por região: {e}")
+
+    results = {}
+    for region in batch:
+        results.update(fetch_regions(session, ([region], start_date, end_date), limiter, cache, hourly))
+    return results
+
+
+def load_watermarks(engine):
+    """Última data histórica gravada por região, mantida em etl_state."""
+    with engine.connect() as conn:
+        rows = conn.execute(text(
+            "SELECT chave, valor FROM etl_state WHERE chave LIKE :prefix"
+        ), {'prefix': f"{WATERMARK_PREFIX}%"}).fetchall()
+    return {
+        chave[len(WATERMARK_PREFIX):]: datetime.date.fromisoformat(valor)
+        for chave, valor in rows
+    }
+
+
+def save_watermark(engine, region_name, last_date):
+    # GREATEST evita que o preenchimento de lacunas antigas faça o watermark regredir
+    with engine.begin() as conn:
+        conn.execute(text("""
+            INSERT INTO etl_state (chave, valor)
+            VALUES (:chave, :valor)
+            ON DUPLICATE KEY UPDATE valor = GREATEST(valor, VALUES(valor))
+        """), {'chave': f"{WATERMARK_PREFIX}{region_name}", 'valor': str(last_date)})
+
+
+def find_gaps(engine, region_name, first_date, last_date):
+    """Intervalos (início, fim) sem linhas em weather_raw entre first_date e last_date."""
+    with engine.connect() as conn:
+        rows = conn.execute(text("""
+            SELECT data FROM weather_raw
+            WHERE regiao = :regiao AND data BETWEEN :inicio AND :fim
+            ORDER BY data
+        """), {'regiao': region_name, 'inicio': first_date, 'fim': last_date}).fetchall()
+
+    gaps = []
+    expected = first_date
+    for (day,) in rows:
+        if day > expected:
+            gaps.append((expected, day - datetime.timedelta(days=1)))
+        expected = day + datetime.timedelta(days=1)
+    if expected <= last_date:
+        gaps.append((expected, last_date))
+    return gaps
+
+
+def plan_backfill(engine, regions, full=False, overlap_days=7):
+    """Agrupa as regiões pelos intervalos de datas que faltam buscar na API histórica.
+
+    Sem watermark (ou com full=True) a região é baixada desde HISTORY_START. Caso
+    contrário busca-se apenas do watermark menos a janela de sobreposição (para
+    correções tardias) até hoje, mais as lacunas encontradas no histórico já gravado.
+    Lacunas só são procuradas a partir do corte de retenção (RAW_RETENTION_MONTHS):
+    meses anteriores podem ter sido arquivados e não devem voltar a ser baixados.
+    """
+    history_start = datetime.date.fromisoformat(os.getenv('HISTORY_START', HISTORY_START))
+    gaps_start = max(history_start, retention_cutoff() or history_start)
+    today = datetime.date.today()
+    watermarks = {} if full else load_watermarks(engine)
+
+    ranges = {}
+    for region in regions:
+        watermark = watermarks.get(region['name'])
+        if watermark is None:
+            region_ranges = [(history_start, today)]
+        else:
+            start = max(history_start, watermark - datetime.timedelta(days=overlap_days))
+            region_ranges = find_gaps(engine, region['name'], gaps_start, start - datetime.timedelta(days=1))
+            region_ranges.append((start, today))
+        for date_range in region_ranges:
+            ranges.setdefault(date_range, []).append(region)
+
+    for (start, end), grouped in ranges.items():
+        logger.info(f"Backfill {start} a {end}: {len(grouped)} regiões")
+    return ranges
+
+
+def last_valid_date(daily):
+    # a API histórica devolve nulos para os dias mais recentes ainda não consolidados
+    last = None
+    for date, value in zip(daily['time'], daily['temperature_2m_max']):
+        if value is not None:
+            last = date
+    return datetime.date.fromisoformat(last) if last else None
+
+
+def upsert_with_retry(engine, records, region_name, table='weather_raw', update_columns=('raw_data',), strategy=None):
+    # tentar gravar com retries em caso de OperationalError
+    attempts = 0
+    while True:
+        try:
+            with metrics.timer('batch_upsert'), engine.begin() as conn:
+                bulk_upsert(conn, table, records, update_columns=list(update_columns), strategy=strategy)
+            return
+        except OperationalError as oe:
+            attempts += 1
+            metrics.incr('db_retries')
+            if attempts >= 3:
+                raise
+            wait = 2 ** attempts
+            logger.warning(f"OperationalError ao inserir dados de {region_name}, tentativa {attempts}, esperando {wait}s: {oe}")
+            time.sleep(wait)
+
+
+def insert_raw(engine, region_name, daily):
+    times = daily['time']
+    temp_max = daily['temperature_2m_max']
+    temp_min = daily['temperature_2m_min']
+    precipitation = daily['precipitation_sum']
+
+    records = []
+    with metrics.timer('json_build'):
+        for i, date in enumerate(times):
+            raw_data = json.dumps({
+                "temperature_2m_max": temp_max[i],
+                "temperature_2m_min": temp_min[i],
+                "precipitation_sum": precipitation[i]
+            })
+            records.append({
+                'regiao': region_name,
+                'data': date,
+                'raw_data': raw_data
+            })
+
+    # o bulk loader divide a carga em comandos multi-linha do tamanho de max_allowed_packet
+    upsert_with_retry(engine, records, region_name)
+    metrics.incr('rows_written', len(records))
+
+    logger.info(f"Dados brutos inseridos para {region_name} - {len(times)} dias")
+
+
+def insert_hourly(engine, region_name, hourly):
+    """Grava as horas em weather_hourly_raw: uma linha por dia com arrays float32 empacotados."""
+    with metrics.timer('hourly_pack'):
+        records = [{'regiao': region_name, **day} for day in pack_days(hourly)]
+    if not records:
+        return
+    # BLOBs não passam pelo TSV do LOAD DATA: sempre INSERT multi-linha
+    upsert_with_retry(engine, records, region_name, table='weather_hourly_raw',
+                      update_columns=('temperatura', 'precipitacao'), strategy='values')
+    metrics.incr('hourly_rows_written', len(records))
+    logger.info(f"Dados horários inseridos para {region_name} - {len(records)} dias")
+
+
+def store_region(engine, region_name, item, historical=False, sink=None):
+    try:
+        daily = item.get('daily') if item else None
+        if not daily:
+            logger.error(f"Resposta sem campo 'daily' para {region_name}")
+            metrics.incr('failures')
+            return
+        insert_raw(engine, region_name, daily)
+        if item.get('hourly'):
+            insert_hourly(engine, region_name, item['hourly'])
+        if sink:
+            # entrega os valores já gravados para quem roda a transformação no mesmo processo
+            sink(region_name, daily)
+        if historical:
+            last_date = last_valid_date(daily)
+            if last_date:
+                save_watermark(engine, region_name, last_date)
+                metrics.max_info('watermark', str(last_date))
+    except Exception as e:
+        logger.error(f"Erro inesperado para {region_name}: {e}")
+        metrics.incr('failures')
+
+
+def run_serial(engine, fetch, jobs, historical, sink=None):
+    for job in jobs:
+        results = fetch(job)
+        for region_name, item in results.items():
+            store_region(engine, region_name, item, historical, sink)
+
+
+def run_concurrent(engine, fetch, jobs, historical, fetch_workers, write_workers, queue_size, sink=None):
+    """Executa busca HTTP e gravação no banco como estágios separados ligados por uma fila limitada.
+
+    A fila cheia bloqueia os fetchers (backpressure), então a memória fica limitada
+    e o tempo total acompanha o estágio mais lento em vez da soma dos dois.
+    """
+    pending = queue.Queue(maxsize=queue_size)
+
+    def writer():
+        while True:
+            item = pending.get()
+            try:
+                if item is None:
+                    return
+                store_region(engine, *item, historical=historical, sink=sink)
+            finally:
+                pending.task_done()
+
+    writers = [threading.Thread(target=writer, name=f"writer-{i}", daemon=True) for i in range(write_workers)]
+    for thread in writers:
+        thread.start()
+
+    def fetcher(job):
+        for region_name, item in fetch(job).items():
+            pending.put((region_name, item))
+
+    with ThreadPoolExecutor(max_workers=fetch_workers, thread_name_prefix="fetcher") as pool:
+        futures = [pool.submit(fetcher, job) for job in jobs]
+        for future in as_completed(futures):
+            if future.exception():
+                logger.error(f"Erro inesperado no estágio de busca: {future.exception()}")
+                metrics.incr('failures')
+
+    # sinaliza fim para cada writer e espera a fila esvaziar
+    for _ in writers:
+        pending.put(None)
+    for thread in writers:
+        thread.join()
+
+
+def extract_weather(historical=False, batch_size=None, concurrent=None, fetch_workers=None, write_workers=None, full=False,
+                    engine=None, sink=None, regions=None, hourly=None):
+    """Extrai da Open-Meteo para weather_raw (e weather_hourly_raw com hourly=True).
+
+    `engine` permite reaproveitar um engine já criado (pipeline em processo único) e
+    `sink(regiao, daily)` recebe os valores de cada região logo após a gravação.
+    `regions` substitui a lista padrão REGIONS (ex.: regiões sintéticas do benchmark).
+    """
     # Carregar variáveis do .env
     load_dotenv()
     database_url = os.getenv('DATABASE_URL')
-    if not database_url:
+    if engine is None and not database_url:
         logger.error("DATABASE_URL não encontrada no arquivo .env")
         return
-    
-    engine = create_engine(database_url)
-    
-    # Regiões administrativas de Brasília (DF) com coordenadas aproximadas
-    regions = [
-        {"name": "Plano Piloto", "lat": -15.7833, "lon": -47.9167},
-        {"name": "Asa Norte", "lat": -15.7633, "lon": -47.8833},
-        {"name": "Asa Sul", "lat": -15.8067, "lon": -47.8833},
-        {"name": "Taguatinga", "lat": -15.8333, "lon": -48.0667},
-        {"name": "Ceilândia", "lat": -15.8167, "lon": -48.1167},
-        {"name": "Samambaia", "lat": -15.8667, "lon": -48.0833},
-        {"name": "Sobradinho", "lat": -15.65, "lon": -47.7833},
-        {"name": "Planaltina", "lat": -15.6167, "lon": -47.65},
-        {"name": "Gama", "lat": -16.0167, "lon": -48.0667},
-        {"name": "Guará", "lat": -15.8167, "lon": -47.9833},
-        {"name": "Núcleo Bandeirante", "lat": -15.8667, "lon": -47.9667},
-        {"name": "Paranoá", "lat": -15.7667, "lon": -47.7833},
-        {"name": "Itapoã", "lat": -15.75, "lon": -47.7667},
-        {"name": "Jardim Botânico", "lat": -15.8667, "lon": -47.8},
-        {"name": "Lago Sul", "lat": -15.8667, "lon": -47.8667},
-        {"name": "Lago Norte", "lat": -15.7167, "lon": -47.8833},
-        {"name": "Candangolândia", "lat": -15.85, "lon": -47.95},
-        {"name": "Varjão", "lat": -15.7167, "lon": -47.8833},
-        {"name": "SIA", "lat": -15.8, "lon": -47.9667},
-        {"name": "Sudoeste", "lat": -15.7833, "lon": -47.9167},
-        {"name": "Santa Maria", "lat": -16.0167, "lon": -47.9833},
-        {"name": "São Sebastião", "lat": -15.9, "lon": -47.7667},
-        {"name": "Recanto das Emas", "lat": -15.9167, "lon": -48.0667},
-        {"name": "Riacho Fundo", "lat": -15.8833, "lon": -48.0167},
-        {"name": "Riacho Fundo II", "lat": -15.9, "lon": -48.0333},
-        {"name": "Estrutural", "lat": -15.7833, "lon": -47.9833},
-        {"name": "Vicente Pires", "lat": -15.8, "lon": -48.0333},
-        {"name": "Águas Claras", "lat": -15.8333, "lon": -48.0333},
-        {"name": "Arniqueira", "lat": -15.85, "lon": -47.9667},
-        {"name": "Brazlândia", "lat": -15.6667, "lon": -48.2},
-        {"name": "Cruzeiro", "lat": -15.7833, "lon": -47.9333},
-        {"name": "Fercal", "lat": -15.6, "lon": -47.8667},
-        {"name": "Park Way", "lat": -15.9, "lon": -47.8167},
-        {"name": "SCIA", "lat": -15.7833, "lon": -47.9667},
-        {"name": "Sobradinho II", "lat": -15.6333, "lon": -47.8167}
-    ]
+
+    if concurrent is None:
+        concurrent = os.getenv('EXTRACT_CONCURRENT', '0').lower() in ('1', 'true', 'yes')
+    if hourly is None:
+        hourly = os.getenv('EXTRACT_HOURLY', '0').lower() in ('1', 'true', 'yes')
+    if fetch_workers is None:
+        fetch_workers = int(os.getenv('FETCH_WORKERS', '4'))
+    if write_workers is None:
+        write_workers = int(os.getenv('WRITE_WORKERS', '2'))
+    fetch_workers = max(1, fetch_workers)
+    write_workers = max(1, write_workers)
+
+    if engine is None:
+        engine = create_etl_engine(database_url, pool_size=max(5, write_workers))
+    regions = regions if regions is not None else REGIONS
 
     # Se variável de ambiente REGIONS estiver setada, usar apenas essas regiões (vírgula-separadas)
     regions_env = os.getenv('REGIONS')
     if regions_env:
         wanted = [r.strip().lower() for r in regions_env.split(',') if r.strip()]
         regions = [r for r in regions if r['name'].strip().lower() in wanted]
-    
-    # Preparar sessão com retries para chamadas HTTP
-    session = requests.Session()
-    retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
-    adapter = HTTPAdapter(max_retries=retries)
-    session.mount("https://", adapter)
-    session.mount("http://", adapter)
-
-    # Fazer transação por região para evitar que uma falha invalidade toda a carga
-    for region in regions:
-        try:
-            if historical:
-                # API histórica para backfill
-                end_date = datetime.date.today()
-                url = f"https://archive-api.open-meteo.com/v1/archive?latitude={region['lat']}&longitude={region['lon']}&start_date=2025-01-01&end_date={end_date}&daily=temperature_2m_max,temperature_2m_min,precipitation_sum&timezone=America/Sao_Paulo"
-            else:
-                # API de forecast para operação normal
-                url = f"https://api.open-meteo.com/v1/forecast?latitude={region['lat']}&longitude={region['lon']}&daily=temperature_2m_max,temperature_2m_min,precipitation_sum&timezone=America/Sao_Paulo"
-
-            response = session.get(url, timeout=15)
-            response.raise_for_status()  # Levanta erro para status != 200
-            data = response.json()
 
-            # Inserir dados brutos por data em transação separada
-            daily = data.get('daily')
-            if not daily:
-                logger.error(f"Resposta sem campo 'daily' para {region['name']}")
-                continue
-
-            times = daily['time']
-            temp_max = daily['temperature_2m_max']
-            temp_min = daily['temperature_2m_min']
-            precipitation = daily['precipitation_sum']
-
-            # Inserir em batches para reduzir lock wait e duração da transação
-            batch_size = 50
-            insert_sql = text("""
-                INSERT INTO weather_raw (regiao, data, raw_data)
-                VALUES (:regiao, :data, :raw_data)
-                ON DUPLICATE KEY UPDATE raw_data = VALUES(raw_data)
-            """)
-
-            records = []
-            for i, date in enumerate(times):
-                raw_data = json.dumps({
-                    "temperature_2m_max": temp_max[i],
-                    "temperature_2m_min": temp_min[i],
-                    "precipitation_sum": precipitation[i]
-                })
-                records.append({
-                    'regiao': region['name'],
-                    'data': date,
-                    'raw_data': raw_data
-                })
-
-                if len(records) >= batch_size:
-                    # tentar inserir o batch com retries em caso de OperationalError
-                    attempts = 0
-                    while attempts < 3:
-                        try:
-                            with engine.begin() as conn:
-                                conn.execute(insert_sql, records)
-                            break
-                        except OperationalError as oe:
-                            attempts += 1
-                            wait = 2 ** attempts
-                            logger.warning(f"OperationalError ao inserir batch em {region['name']}, tentativa {attempts}, esperando {wait}s: {oe}")
-                            time.sleep(wait)
-                    records = []
-
-            # inserir resto
-            if records:
-                attempts = 0
-                while attempts < 3:
-                    try:
-                        with engine.begin() as conn:
-                            conn.execute(insert_sql, records)
-                        break
-                    except OperationalError as oe:
-                        attempts += 1
-                        wait = 2 ** attempts
-                        logger.warning(f"OperationalError ao inserir batch final em {region['name']}, tentativa {attempts}, esperando {wait}s: {oe}")
-                        time.sleep(wait)
-
-            logger.info(f"Dados brutos inseridos para {region['name']} - {len(times)} dias")
-
-            # diminui probabilidade de throttling e reduz pressão no BD
-            time.sleep(1)
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erro na requisição para {region['name']}: {e}")
-        except Exception as e:
-            logger.error(f"Erro inesperado para {region['name']}: {e}")
+    # Quantidade de regiões por requisição (FETCH_BATCH_SIZE=1 volta ao modo uma chamada por região)
+    if batch_size is None:
+        batch_size = int(os.getenv('FETCH_BATCH_SIZE', '10'))
+    batch_size = max(1, batch_size)
+
+    job_name = f"extract_{'historical' if historical else 'forecast'}"
+    with metrics.track_run(engine, job_name):
+        # Cada job é (pontos, data inicial, data final); no forecast as datas ficam em branco
+        if historical:
+            overlap_days = int(os.getenv('BACKFILL_OVERLAP_DAYS', '7'))
+            date_ranges = plan_backfill(engine, regions, full=full, overlap_days=overlap_days)
+        else:
+            date_ranges = {(None, None): regions}
+
+        # regiões com as mesmas coordenadas viram um único ponto buscado uma vez só
+        precision = int(os.getenv('COORD_PRECISION', '2'))
+        jobs = []
+        for (start_date, end_date), grouped in date_ranges.items():
+            points = plan_points(grouped, precision)
+            jobs.extend(
+                (points[start:start + batch_size], start_date, end_date)
+                for start in range(0, len(points), batch_size)
+            )
+        logger.info(f"{len(regions)} regiões em {len(jobs)} requisições")
+
+        # Cache de respostas em disco: re-execuções no mesmo dia não repetem downloads
+        cache = None
+        if os.getenv('HTTP_CACHE', '1').lower() in ('1', 'true', 'yes'):
+            default_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache', 'open-meteo')
+            cache = ResponseCache(
+                os.getenv('HTTP_CACHE_DIR', default_dir),
+                max_bytes=int(os.getenv('HTTP_CACHE_MAX_MB', '200')) * 1024 * 1024
+            )
+
+        # Limite de requisições compartilhado entre todos os fetchers (substitui o sleep fixo); 0 desliga
+        rate = float(os.getenv('RATE_LIMIT_PER_SEC', '1'))
+        limiter = TokenBucket(rate=rate, capacity=float(os.getenv('RATE_LIMIT_BURST', '1'))) if rate != 0 else None
+
+        # Preparar sessão com retries para chamadas HTTP
+        session = requests.Session()
+        retries = Retry(total=3, backoff_factor=1, status_forcelist=[429, 500, 502, 503, 504])
+        adapter = HTTPAdapter(max_retries=retries, pool_maxsize=max(10, fetch_workers))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        fetch = functools.partial(fetch_regions, session, limiter=limiter, cache=cache, hourly=hourly)
+
+        # A gravação continua em transação por região para evitar que uma falha invalide toda a carga
+        if concurrent:
+            logger.info(f"Extração concorrente: {fetch_workers} fetchers, {write_workers} writers")
+            run_concurrent(engine, fetch, jobs, historical, fetch_workers, write_workers,
+                           queue_size=int(os.getenv('WRITE_QUEUE_SIZE', str(write_workers * 4))), sink=sink)
+        else:
+            run_serial(engine, fetch, jobs, historical, sink)
 
 if __name__ == "__main__":
-    import sys
-    historical = len(sys.argv) > 1 and sys.argv[1] == 'historical'
-    extract_weather(historical=historical)
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Extrai dados da Open-Meteo para weather_raw")
+    parser.add_argument('mode', nargs='?', choices=['forecast', 'historical'], default='forecast')
+    parser.add_argument('--full', action='store_true', help="historical: baixa tudo desde HISTORY_START ignorando o watermark")
+    parser.add_argument('--concurrent', action='store_true', default=None, help="busca e gravação em paralelo")
+    parser.add_argument('--fetch-workers', type=int, default=None)
+    parser.add_argument('--write-workers', type=int, default=None)
+    parser.add_argument('--hourly', action='store_true', default=None,
+                        help="também baixa temperatura e precipitação horárias para weather_hourly_raw")
+    args = parser.parse_args()
+    extract_weather(
+        historical=args.mode == 'historical',
+        concurrent=args.concurrent,
+        fetch_workers=args.fetch_workers,
+        write_workers=args.write_workers,
+        full=args.full,
+        hourly=args.hourly
+    )
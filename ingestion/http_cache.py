@@ -0,0 +1,81 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """Cache em disco de respostas JSON da Open-Meteo, chaveado pela URL.
+
+    Cada entrada é um arquivo com a data de expiração (None = permanente). A leitura
+    atualiza o mtime do arquivo, que serve de ordem LRU para a remoção quando o
+    diretório passa de `max_bytes`.
+    """
+
+    def __init__(self, directory, max_bytes=200 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, url):
+        path = self._path(url)
+        try:
+            with open(path, encoding='utf-8') as handle:
+                entry = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        if entry['expires_at'] is not None and entry['expires_at'] < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return entry['data']
+
+    def set(self, url, data, ttl=None):
+        """Grava `data`; ttl em segundos ou None para nunca expirar."""
+        path = self._path(url)
+        entry = {'url': url, 'expires_at': time.time() + ttl if ttl is not None else None, 'data': data}
+        # escrita atômica: outro fetcher nunca lê um arquivo pela metade
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as handle:
+            json.dump(entry, handle)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self):
+        with self.lock:
+            entries = []
+            total = 0
+            for name in os.listdir(self.directory):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, name))
+                total += stat.st_size
+
+            # remove as entradas usadas há mais tempo até caber no limite
+            for _, size, name in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                self._remove(os.path.join(self.directory, name))
+                total -= size
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,100 @@
+"""Extração e transformação num único processo, com um único engine.
+
+Os valores recém-baixados passam direto para a transformação (weather_raw continua
+sendo gravada para auditoria), sem serializar/reler o JSON de weather_raw.
+
+Uso: python pipeline/run_pipeline.py [historical] [--full] [--skip-extract] [--skip-transform] [--skip-snapshot]
+"""
+import argparse
+import logging
+import os
+import sys
+import threading
+
+import pandas as pd
+from dotenv import load_dotenv
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import metrics
+from common.db import create_etl_engine
+from ingestion.extract_weather import extract_weather
+from transform.transform_weather import load_records, publish, transform_weather
+
+logger = logging.getLogger(__name__)
+
+
+class RecordCollector:
+    """Sink da extração: acumula os valores tipados de cada região (thread-safe para o modo concorrente)."""
+
+    def __init__(self):
+        self.frames = []
+        self.lock = threading.Lock()
+
+    def __call__(self, region_name, daily):
+        frame = pd.DataFrame({
+            'regiao': region_name,
+            'data': pd.to_datetime(daily['time']),
+            'temperatura_maxima': pd.to_numeric(daily['temperature_2m_max'], errors='coerce'),
+            'temperatura_minima': pd.to_numeric(daily['temperature_2m_min'], errors='coerce'),
+            'precipitacao_total': pd.to_numeric(daily['precipitation_sum'], errors='coerce')
+        })
+        with self.lock:
+            self.frames.append(frame)
+
+    def frame(self):
+        if not self.frames:
+            return pd.DataFrame()
+        return pd.concat(self.frames, ignore_index=True)
+
+
+def run_pipeline(historical=False, full=False, extract=True, transform=True, snapshot=True, concurrent=None):
+    load_dotenv()
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL não encontrada no arquivo .env")
+        return
+
+    # um engine com pool compartilhado pelas duas etapas
+    write_workers = int(os.getenv('WRITE_WORKERS', '2'))
+    engine = create_etl_engine(database_url, pool_size=max(5, write_workers))
+
+    if not extract:
+        # sem extração não há registros em memória: transformação incremental normal a partir de weather_raw
+        if transform:
+            transform_weather(full=full, engine=engine, snapshot=snapshot)
+        return
+
+    # a extração registra a própria execução em etl_runs; 'pipeline' cobre o total e a carga em memória
+    with metrics.track_run(engine, 'pipeline'):
+        collector = RecordCollector() if transform else None
+        extract_weather(historical=historical, full=full, concurrent=concurrent, engine=engine, sink=collector)
+
+        if transform:
+            df = collector.frame()
+            if df.empty:
+                logger.warning("Extração não trouxe registros para transformar")
+                return
+            metrics.incr('rows_read', len(df))
+            # o watermark da transformação não avança aqui: linhas gravadas por outros
+            # processos continuam sendo pegas pela próxima transformação incremental
+            if load_records(engine, df) and snapshot:
+                publish(engine)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pipeline extract -> transform num único processo")
+    parser.add_argument('mode', nargs='?', choices=['forecast', 'historical'], default='forecast')
+    parser.add_argument('--full', action='store_true', help="historical: ignora watermarks e baixa/reprocessa tudo")
+    parser.add_argument('--concurrent', action='store_true', default=None, help="extração com busca e gravação em paralelo")
+    parser.add_argument('--skip-extract', action='store_true', help="só transforma (lendo o delta de weather_raw)")
+    parser.add_argument('--skip-transform', action='store_true', help="só extrai para weather_raw")
+    parser.add_argument('--skip-snapshot', action='store_true', help="não publica o snapshot Parquet")
+    args = parser.parse_args()
+    run_pipeline(
+        historical=args.mode == 'historical',
+        full=args.full,
+        extract=not args.skip_extract,
+        transform=not args.skip_transform,
+        snapshot=not args.skip_snapshot,
+        concurrent=args.concurrent
+    )
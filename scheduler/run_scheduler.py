@@ -0,0 +1,223 @@
+"""Executa o ETL diário como um grafo de etapas: backfill -> forecast -> transform -> snapshot.
+
+As etapas de extração entregam os valores baixados a um RecordCollector (como o
+pipeline em processo único) e a transformação carrega esses registros sem reler
+weather_raw, voltando à leitura incremental se o delta tiver linhas de fora da execução.
+
+A manutenção de partições (partitions) roda antes, sem bloquear as demais se falhar:
+a partição coringa pfuture recebe as linhas mesmo sem as partições do mês.
+
+Um lock exclusivo (GET_LOCK no MySQL ou flock em arquivo) impede execuções
+sobrepostas; cada etapa é refeita com backoff exponencial com jitter e as etapas
+seguintes só rodam depois que as dependências terminam. O cron apenas dispara este
+script (ver docker/start-cron.sh); com --catch-up ele roda só se a última execução
+completa for mais antiga que SCHEDULER_INTERVAL_HOURS, o que recupera execuções
+perdidas enquanto o container estava parado.
+
+Uso: python scheduler/run_scheduler.py [--catch-up] [--stages transform snapshot]
+"""
+import argparse
+import contextlib
+import datetime
+import fcntl
+import logging
+import os
+import random
+import sys
+import time
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import metrics
+from common.db import create_etl_engine
+from common.partitions import maintain_partitions
+from common.snapshot import publish_snapshot
+from ingestion.extract_weather import extract_weather
+from pipeline.run_pipeline import RecordCollector
+from transform.transform_weather import get_state, set_state, transform_records
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = 'clima_df_etl'
+LAST_RUN_KEY = 'scheduler_last_run'
+
+
+def stage_partitions(engine, records):
+    maintain_partitions(engine, archive=os.getenv('PARTITION_ARCHIVE', '0').lower() in ('1', 'true', 'yes'))
+
+
+def stage_backfill(engine, records):
+    extract_weather(historical=True, engine=engine, sink=records)
+    return metrics.last_status.get('extract_historical')
+
+
+def stage_forecast(engine, records):
+    extract_weather(engine=engine, sink=records)
+    return metrics.last_status.get('extract_forecast')
+
+
+def stage_transform(engine, records):
+    # o rollup mensal é atualizado na mesma transação da carga diária; o snapshot é a etapa seguinte
+    transform_records(engine, records.frame(), snapshot=False)
+    return metrics.last_status.get('transform')
+
+
+def stage_snapshot(engine, records):
+    if os.getenv('SNAPSHOT', '1').lower() not in ('1', 'true', 'yes'):
+        return 'skipped'
+    try:
+        with metrics.track_run(engine, 'snapshot'):
+            publish_snapshot(engine)
+    except ImportError:
+        logger.warning("pyarrow não instalado, snapshot Parquet não publicado")
+        return 'skipped'
+    return metrics.last_status.get('snapshot')
+
+
+# etapa -> (função, dependências)
+STAGES = {
+    'partitions': (stage_partitions, []),
+    'backfill': (stage_backfill, []),
+    'forecast': (stage_forecast, ['backfill']),
+    'transform': (stage_transform, ['forecast']),
+    'snapshot': (stage_snapshot, ['transform'])
+}
+
+
+def execution_order(stages):
+    """Ordem topológica das etapas (erro se houver ciclo)."""
+    order = []
+    pending = {name: set(deps) & set(stages) for name, (_, deps) in stages.items()}
+    while pending:
+        ready = [name for name, deps in pending.items() if not deps]
+        if not ready:
+            raise ValueError(f"Dependência circular entre as etapas: {', '.join(pending)}")
+        for name in ready:
+            order.append(name)
+            del pending[name]
+        for deps in pending.values():
+            deps.difference_update(ready)
+    return order
+
+
+def run_with_retry(name, func, engine, records, retries, backoff):
+    """Roda uma etapa; 'failed' ou 'partial' são refeitos até `retries` vezes com jitter."""
+    attempt = 0
+    while True:
+        try:
+            status = func(engine, records) or 'success'
+        except Exception as e:
+            logger.error(f"Etapa {name} falhou: {e}")
+            status = 'failed'
+        if status in ('success', 'skipped') or attempt >= retries:
+            return status
+        attempt += 1
+        # backoff exponencial com jitter para não repetir em sincronia com a causa da falha
+        wait = backoff * 2 ** (attempt - 1) * random.uniform(0.5, 1.5)
+        logger.warning(f"Etapa {name} terminou como {status}, tentativa {attempt}/{retries} em {wait:.0f}s")
+        time.sleep(wait)
+
+
+@contextlib.contextmanager
+def run_lock(engine):
+    """Lock exclusivo da execução; devolve False se outra execução já o detém.
+
+    No MySQL usa GET_LOCK numa conexão mantida aberta durante toda a execução (o
+    servidor libera o lock se o processo morrer). Com SCHEDULER_LOCK=file, ou fora
+    do MySQL, usa flock em SCHEDULER_LOCK_FILE.
+    """
+    if engine.dialect.name == 'mysql' and os.getenv('SCHEDULER_LOCK', 'db') == 'db':
+        with engine.connect() as conn:
+            acquired = conn.execute(text("SELECT GET_LOCK(:nome, 0)"), {'nome': LOCK_NAME}).scalar() == 1
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    conn.execute(text("SELECT RELEASE_LOCK(:nome)"), {'nome': LOCK_NAME})
+        return
+
+    path = os.getenv('SCHEDULER_LOCK_FILE', f"/tmp/{LOCK_NAME}.lock")
+    with open(path, 'w') as handle:
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            acquired = True
+        except BlockingIOError:
+            acquired = False
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def is_due(engine):
+    """Catch-up: há execução pendente se a última completa for mais antiga que o intervalo."""
+    last_run = get_state(engine, LAST_RUN_KEY)
+    if not last_run:
+        return True
+    interval = datetime.timedelta(hours=float(os.getenv('SCHEDULER_INTERVAL_HOURS', '24')))
+    return datetime.datetime.now() - datetime.datetime.fromisoformat(last_run) >= interval
+
+
+def run_scheduler(stages=None, catch_up=False):
+    load_dotenv()
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL não encontrada no arquivo .env")
+        return 1
+
+    write_workers = int(os.getenv('WRITE_WORKERS', '2'))
+    engine = create_etl_engine(database_url, pool_size=max(5, write_workers))
+    retries = int(os.getenv('SCHEDULER_RETRIES', '2'))
+    backoff = float(os.getenv('SCHEDULER_BACKOFF_SECONDS', '60'))
+    selected = {name: STAGES[name] for name in (stages or STAGES)}
+
+    with run_lock(engine) as acquired:
+        if not acquired:
+            logger.warning("Outra execução do ETL está em andamento, nada a fazer")
+            return 0
+        if catch_up and not is_due(engine):
+            logger.info("Última execução ainda dentro do intervalo, nada a recuperar")
+            return 0
+
+        results = {}
+        # registros baixados pelas extrações desta execução, entregues à transformação em memória
+        records = RecordCollector()
+        with metrics.track_run(engine, 'scheduler') as run:
+            for name in execution_order(selected):
+                func, deps = selected[name]
+                failed_deps = [dep for dep in deps if results.get(dep) in ('failed', 'blocked')]
+                if failed_deps:
+                    logger.error(f"Etapa {name} não executada: dependência {', '.join(failed_deps)} falhou")
+                    results[name] = 'blocked'
+                else:
+                    logger.info(f"Iniciando etapa {name}")
+                    with metrics.timer(name):
+                        results[name] = run_with_retry(name, func, engine, records, retries, backoff)
+                    logger.info(f"Etapa {name}: {results[name]}")
+                run.set(name, results[name])
+                if results[name] not in ('success', 'skipped'):
+                    run.incr('failures')
+
+            # só execuções completas do grafo contam para o catch-up
+            if not stages and all(status not in ('failed', 'blocked') for status in results.values()):
+                with engine.begin() as conn:
+                    set_state(conn, LAST_RUN_KEY, datetime.datetime.now().isoformat(timespec='seconds'))
+
+    return 1 if any(status in ('failed', 'blocked') for status in results.values()) else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scheduler do ETL: etapas com dependências, lock e retries")
+    parser.add_argument('--catch-up', action='store_true',
+                        help="roda apenas se a última execução completa for mais antiga que SCHEDULER_INTERVAL_HOURS")
+    parser.add_argument('--stages', nargs='+', default=None,
+                        help=f"executa só estas etapas, na ordem do grafo: {', '.join(STAGES)}")
+    args = parser.parse_args()
+    unknown = [name for name in args.stages or [] if name not in STAGES]
+    if unknown:
+        parser.error(f"etapa desconhecida: {', '.join(unknown)}")
+    sys.exit(run_scheduler(stages=args.stages, catch_up=args.catch_up))
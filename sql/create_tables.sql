@@ -2,21 +2,154 @@ CREATE DATABASE IF NOT EXISTS weather_db;
 
 USE weather_db;
 
+-- Tabelas de fatos particionadas por mês em `data` (partições mensais criadas por tools/migrate.py);
+-- toda chave única de tabela particionada precisa conter a coluna de particionamento
 CREATE TABLE IF NOT EXISTS weather_raw (
-    id INT AUTO_INCREMENT PRIMARY KEY,
+    id INT AUTO_INCREMENT,
     regiao VARCHAR(255),
-    data DATE,
+    data DATE NOT NULL,
     raw_data JSON,
-    CONSTRAINT uq_raw_regiao_data UNIQUE (regiao, data)
+    -- só muda quando o conteúdo da linha muda (ON DUPLICATE KEY UPDATE sem alteração não toca a coluna)
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- colunas tipadas geradas a partir do JSON (usadas pela transformação no modo sql)
+    temperatura_maxima DECIMAL(7,2) GENERATED ALWAYS AS (CAST(NULLIF(JSON_UNQUOTE(JSON_EXTRACT(raw_data, '$.temperature_2m_max')), 'null') AS DECIMAL(7,2))) STORED,
+    temperatura_minima DECIMAL(7,2) GENERATED ALWAYS AS (CAST(NULLIF(JSON_UNQUOTE(JSON_EXTRACT(raw_data, '$.temperature_2m_min')), 'null') AS DECIMAL(7,2))) STORED,
+    precipitacao_total DECIMAL(7,2) GENERATED ALWAYS AS (CAST(NULLIF(JSON_UNQUOTE(JSON_EXTRACT(raw_data, '$.precipitation_sum')), 'null') AS DECIMAL(7,2))) STORED,
+    PRIMARY KEY (id, data),
+    CONSTRAINT uq_raw_regiao_data UNIQUE (regiao, data),
+    INDEX idx_raw_updated_at (updated_at)
+)
+PARTITION BY RANGE COLUMNS (data) (
+    PARTITION p_anterior VALUES LESS THAN ('2025-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
+
+-- Dados horários opcionais (EXTRACT_HOURLY=1): uma linha por região e dia com as 24 horas
+-- de cada variável em BLOB (24 × float32 little-endian, ver common/hourly.py)
+CREATE TABLE IF NOT EXISTS weather_hourly_raw (
+    regiao VARCHAR(255) NOT NULL,
+    -- preenchido pelo trigger trg_weather_hourly_regiao, como em weather_daily
+    regiao_id SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+    data DATE NOT NULL,
+    temperatura BLOB,
+    precipitacao BLOB,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (regiao_id, data),
+    INDEX idx_hourly_updated_at (updated_at)
+)
+PARTITION BY RANGE COLUMNS (data) (
+    PARTITION p_anterior VALUES LESS THAN ('2025-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
+
+-- Dimensão de regiões: id SMALLINT usado nos índices no lugar do nome
+CREATE TABLE IF NOT EXISTS dim_regiao (
+    regiao_id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL,
+    CONSTRAINT uq_dim_regiao_nome UNIQUE (nome)
 );
 
 CREATE TABLE IF NOT EXISTS weather_daily (
-    id INT AUTO_INCREMENT PRIMARY KEY,
-    regiao VARCHAR(255),
-    data DATE,
+    id INT AUTO_INCREMENT,
+    -- nome mantido para leitura e compatibilidade; a chave usa o id da dimensão
+    regiao VARCHAR(255) NOT NULL,
+    -- preenchido pelo trigger abaixo (o DEFAULT só existe para o INSERT sem a coluna passar no modo estrito)
+    regiao_id SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+    data DATE NOT NULL,
     temperatura_maxima FLOAT,
     temperatura_minima FLOAT,
     precipitacao_total FLOAT,
     amplitude_termica FLOAT,
-    CONSTRAINT uq_regiao_data UNIQUE (regiao, data)
-);
\ No newline at end of file
+    PRIMARY KEY (id, data),
+    CONSTRAINT uq_daily_regiao_id_data UNIQUE (regiao_id, data),
+    -- índice de cobertura para consultas por intervalo de datas (dashboard)
+    INDEX idx_daily_data_cover (data, regiao_id, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica)
+)
+PARTITION BY RANGE COLUMNS (data) (
+    PARTITION p_anterior VALUES LESS THAN ('2025-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
+
+-- regiao_id preenchido na escrita: o ETL continua gravando só o nome da região.
+-- Consulta antes de inserir porque INSERT IGNORE consumiria um id a cada upsert.
+DELIMITER //
+CREATE TRIGGER IF NOT EXISTS trg_weather_daily_regiao BEFORE INSERT ON weather_daily
+FOR EACH ROW
+BEGIN
+    SET NEW.regiao_id = (SELECT regiao_id FROM dim_regiao WHERE nome = NEW.regiao);
+    IF NEW.regiao_id IS NULL AND NEW.regiao IS NOT NULL THEN
+        INSERT INTO dim_regiao (nome) VALUES (NEW.regiao);
+        SET NEW.regiao_id = LAST_INSERT_ID();
+    END IF;
+END//
+
+CREATE TRIGGER IF NOT EXISTS trg_weather_hourly_regiao BEFORE INSERT ON weather_hourly_raw
+FOR EACH ROW
+BEGIN
+    SET NEW.regiao_id = (SELECT regiao_id FROM dim_regiao WHERE nome = NEW.regiao);
+    IF NEW.regiao_id IS NULL THEN
+        INSERT INTO dim_regiao (nome) VALUES (NEW.regiao);
+        SET NEW.regiao_id = LAST_INSERT_ID();
+    END IF;
+END//
+DELIMITER ;
+
+-- Estado incremental do ETL (watermarks, checkpoints) em formato chave/valor
+CREATE TABLE IF NOT EXISTS etl_state (
+    chave VARCHAR(255) PRIMARY KEY,
+    valor VARCHAR(255),
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
+
+-- Rollup mensal mantido pela transformação (KPIs do dashboard numa consulta indexada)
+CREATE TABLE IF NOT EXISTS weather_monthly (
+    regiao VARCHAR(255) NOT NULL,
+    ano SMALLINT NOT NULL,
+    mes TINYINT NOT NULL,
+    dias INT,
+    temperatura_maxima_media FLOAT,
+    temperatura_minima_media FLOAT,
+    precipitacao_total FLOAT,
+    amplitude_media FLOAT,
+    dias_calor_extremo INT,
+    dias_frio_extremo INT,
+    dias_chuva_forte INT,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (regiao, ano, mes),
+    INDEX idx_monthly_ano_mes (ano, mes)
+);
+-- Ledger de execuções do ETL (common/metrics.py): uma linha por execução de extração/transformação
+CREATE TABLE IF NOT EXISTS etl_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    job VARCHAR(64) NOT NULL,
+    iniciado_em DATETIME(3) NOT NULL,
+    finalizado_em DATETIME(3),
+    duracao_segundos DOUBLE,
+    -- running, success, partial (regiões/lotes perdidos) ou failed
+    status VARCHAR(16) NOT NULL,
+    linhas_lidas INT,
+    linhas_gravadas INT,
+    falhas INT,
+    watermark VARCHAR(255),
+    erro TEXT,
+    -- tempos por etapa e contadores completos
+    metricas JSON,
+    INDEX idx_runs_job_inicio (job, iniciado_em)
+);
+
+-- Migrações já incorporadas a este script (tools/migrate.py aplica só as seguintes)
+CREATE TABLE IF NOT EXISTS schema_migrations (
+    versao VARCHAR(255) PRIMARY KEY,
+    aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT IGNORE INTO schema_migrations (versao) VALUES
+    ('000_etl_state'),
+    ('001_weather_raw_updated_at'),
+    ('002_weather_monthly'),
+    ('003_weather_raw_typed_columns'),
+    ('004_etl_runs'),
+    ('005_partitioning_dim_regiao'),
+    ('006_weather_hourly_raw'),
+    ('007_weather_daily_regiao_id_key'),
+    ('008_weather_hourly_raw_regiao_id_key');
@@ -0,0 +1,10 @@
+-- Estado incremental do ETL (watermarks de backfill e da transformação, checkpoints,
+-- última execução do scheduler). Vem antes das demais porque todas as etapas do ETL e
+-- o dashboard leem ou gravam nesta tabela; em bancos que já a têm não faz nada.
+USE weather_db;
+
+CREATE TABLE IF NOT EXISTS etl_state (
+    chave VARCHAR(255) PRIMARY KEY,
+    valor VARCHAR(255),
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+);
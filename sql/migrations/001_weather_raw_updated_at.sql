@@ -0,0 +1,6 @@
+-- Rastreamento de alterações em weather_raw para a transformação incremental
+USE weather_db;
+
+ALTER TABLE weather_raw
+    ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    ADD INDEX idx_raw_updated_at (updated_at);
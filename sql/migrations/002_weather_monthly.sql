@@ -0,0 +1,19 @@
+-- Rollup mensal mantido pela transformação; popular com transform_weather.py --full
+USE weather_db;
+
+CREATE TABLE IF NOT EXISTS weather_monthly (
+    regiao VARCHAR(255) NOT NULL,
+    ano SMALLINT NOT NULL,
+    mes TINYINT NOT NULL,
+    dias INT,
+    temperatura_maxima_media FLOAT,
+    temperatura_minima_media FLOAT,
+    precipitacao_total FLOAT,
+    amplitude_media FLOAT,
+    dias_calor_extremo INT,
+    dias_frio_extremo INT,
+    dias_chuva_forte INT,
+    atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (regiao, ano, mes),
+    INDEX idx_monthly_ano_mes (ano, mes)
+);
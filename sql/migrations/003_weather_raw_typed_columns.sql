@@ -0,0 +1,9 @@
+-- Colunas tipadas em weather_raw geradas a partir do JSON, para a transformação
+-- inteiramente no MySQL (transform_weather.py --mode sql). STORED: calculadas uma
+-- vez na escrita, sem decodificar o JSON a cada leitura.
+USE weather_db;
+
+ALTER TABLE weather_raw
+    ADD COLUMN temperatura_maxima DECIMAL(7,2) GENERATED ALWAYS AS (CAST(NULLIF(JSON_UNQUOTE(JSON_EXTRACT(raw_data, '$.temperature_2m_max')), 'null') AS DECIMAL(7,2))) STORED,
+    ADD COLUMN temperatura_minima DECIMAL(7,2) GENERATED ALWAYS AS (CAST(NULLIF(JSON_UNQUOTE(JSON_EXTRACT(raw_data, '$.temperature_2m_min')), 'null') AS DECIMAL(7,2))) STORED,
+    ADD COLUMN precipitacao_total DECIMAL(7,2) GENERATED ALWAYS AS (CAST(NULLIF(JSON_UNQUOTE(JSON_EXTRACT(raw_data, '$.precipitation_sum')), 'null') AS DECIMAL(7,2))) STORED;
@@ -0,0 +1,20 @@
+-- Ledger de execuções do ETL (common/metrics.py): uma linha por execução de extração/transformação
+USE weather_db;
+
+CREATE TABLE IF NOT EXISTS etl_runs (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    job VARCHAR(64) NOT NULL,
+    iniciado_em DATETIME(3) NOT NULL,
+    finalizado_em DATETIME(3),
+    duracao_segundos DOUBLE,
+    -- running, success, partial (regiões/lotes perdidos) ou failed
+    status VARCHAR(16) NOT NULL,
+    linhas_lidas INT,
+    linhas_gravadas INT,
+    falhas INT,
+    watermark VARCHAR(255),
+    erro TEXT,
+    -- tempos por etapa e contadores completos
+    metricas JSON,
+    INDEX idx_runs_job_inicio (job, iniciado_em)
+);
@@ -0,0 +1,53 @@
+-- Particionamento mensal por data, dimensão compacta de regiões e índice de cobertura
+-- para as consultas por intervalo de datas do dashboard. Aplicar com tools/migrate.py,
+-- que em seguida cria as partições mensais a partir de pfuture (ver common/partitions.py).
+USE weather_db;
+
+CREATE TABLE IF NOT EXISTS dim_regiao (
+    regiao_id SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+    nome VARCHAR(255) NOT NULL,
+    CONSTRAINT uq_dim_regiao_nome UNIQUE (nome)
+);
+
+INSERT IGNORE INTO dim_regiao (nome)
+SELECT regiao FROM (SELECT regiao FROM weather_raw UNION SELECT regiao FROM weather_daily) r
+WHERE regiao IS NOT NULL
+ORDER BY regiao;
+
+ALTER TABLE weather_daily ADD COLUMN regiao_id SMALLINT UNSIGNED NULL AFTER regiao;
+
+UPDATE weather_daily d JOIN dim_regiao r ON r.nome = d.regiao SET d.regiao_id = r.regiao_id;
+
+-- toda chave única de uma tabela particionada precisa conter a coluna de particionamento
+ALTER TABLE weather_daily
+    MODIFY data DATE NOT NULL,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, data),
+    ADD INDEX idx_daily_data_cover (data, regiao_id, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica)
+PARTITION BY RANGE COLUMNS (data) (
+    PARTITION p_anterior VALUES LESS THAN ('2025-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
+
+ALTER TABLE weather_raw
+    MODIFY data DATE NOT NULL,
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (id, data)
+PARTITION BY RANGE COLUMNS (data) (
+    PARTITION p_anterior VALUES LESS THAN ('2025-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
+
+-- regiao_id preenchido na escrita: o ETL continua gravando só o nome da região.
+-- Consulta antes de inserir porque INSERT IGNORE consumiria um id a cada upsert.
+DELIMITER //
+CREATE TRIGGER trg_weather_daily_regiao BEFORE INSERT ON weather_daily
+FOR EACH ROW
+BEGIN
+    SET NEW.regiao_id = (SELECT regiao_id FROM dim_regiao WHERE nome = NEW.regiao);
+    IF NEW.regiao_id IS NULL AND NEW.regiao IS NOT NULL THEN
+        INSERT INTO dim_regiao (nome) VALUES (NEW.regiao);
+        SET NEW.regiao_id = LAST_INSERT_ID();
+    END IF;
+END//
+DELIMITER ;
@@ -0,0 +1,18 @@
+-- Dados horários opcionais (EXTRACT_HOURLY=1): uma linha por região e dia com as 24 horas
+-- de cada variável empacotadas em BLOB (24 × float32 little-endian, ver common/hourly.py).
+-- Particionada por mês como weather_raw; as partições mensais são criadas por tools/migrate.py.
+USE weather_db;
+
+CREATE TABLE IF NOT EXISTS weather_hourly_raw (
+    regiao VARCHAR(255) NOT NULL,
+    data DATE NOT NULL,
+    temperatura BLOB,
+    precipitacao BLOB,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    PRIMARY KEY (regiao, data),
+    INDEX idx_hourly_updated_at (updated_at)
+)
+PARTITION BY RANGE COLUMNS (data) (
+    PARTITION p_anterior VALUES LESS THAN ('2025-01-01'),
+    PARTITION pfuture VALUES LESS THAN (MAXVALUE)
+);
@@ -0,0 +1,21 @@
+-- weather_daily passa a ser chaveada por (regiao_id, data): a chave única sobre o
+-- VARCHAR(255) regiao dá lugar a uma sobre o SMALLINT da dimensão. O ETL continua
+-- gravando só o nome; o trigger BEFORE INSERT preenche regiao_id antes da checagem
+-- de duplicidade, então o ON DUPLICATE KEY UPDATE dos upserts usa a chave nova.
+USE weather_db;
+
+-- linhas sem região não têm chave válida
+DELETE FROM weather_daily WHERE regiao IS NULL;
+
+INSERT IGNORE INTO dim_regiao (nome)
+SELECT DISTINCT regiao FROM weather_daily WHERE regiao_id IS NULL;
+
+UPDATE weather_daily d JOIN dim_regiao r ON r.nome = d.regiao
+SET d.regiao_id = r.regiao_id
+WHERE d.regiao_id IS NULL;
+
+-- DEFAULT 0 só para o INSERT sem a coluna passar no modo estrito; o trigger sempre o substitui
+ALTER TABLE weather_daily
+    MODIFY regiao_id SMALLINT UNSIGNED NOT NULL DEFAULT 0,
+    DROP INDEX uq_regiao_data,
+    ADD CONSTRAINT uq_daily_regiao_id_data UNIQUE (regiao_id, data);
@@ -0,0 +1,34 @@
+-- weather_hourly_raw passa a ser chaveada por (regiao_id, data), como weather_daily
+-- (migração 007): a chave primária sobre o VARCHAR(255) regiao dá lugar a uma sobre o
+-- SMALLINT da dimensão. O ETL continua gravando só o nome; o trigger BEFORE INSERT
+-- preenche regiao_id antes da checagem de duplicidade, então o ON DUPLICATE KEY UPDATE
+-- da gravação horária usa a chave nova.
+USE weather_db;
+
+-- DEFAULT 0 só para o INSERT sem a coluna passar no modo estrito; o trigger sempre o substitui
+ALTER TABLE weather_hourly_raw
+    ADD COLUMN regiao_id SMALLINT UNSIGNED NOT NULL DEFAULT 0 AFTER regiao;
+
+DELIMITER //
+CREATE TRIGGER trg_weather_hourly_regiao BEFORE INSERT ON weather_hourly_raw
+FOR EACH ROW
+BEGIN
+    SET NEW.regiao_id = (SELECT regiao_id FROM dim_regiao WHERE nome = NEW.regiao);
+    IF NEW.regiao_id IS NULL THEN
+        INSERT INTO dim_regiao (nome) VALUES (NEW.regiao);
+        SET NEW.regiao_id = LAST_INSERT_ID();
+    END IF;
+END//
+DELIMITER ;
+
+INSERT IGNORE INTO dim_regiao (nome)
+SELECT DISTINCT regiao FROM weather_hourly_raw WHERE regiao_id = 0;
+
+UPDATE weather_hourly_raw h JOIN dim_regiao r ON r.nome = h.regiao
+SET h.regiao_id = r.regiao_id
+WHERE h.regiao_id = 0;
+
+-- a chave de uma tabela particionada precisa incluir a coluna de particionamento (data)
+ALTER TABLE weather_hourly_raw
+    DROP PRIMARY KEY,
+    ADD PRIMARY KEY (regiao_id, data);
@@ -0,0 +1,147 @@
+"""Aplica as migrações versionadas de sql/migrations e mantém as partições por data.
+
+As versões aplicadas ficam em schema_migrations (uma linha por arquivo). Bancos
+criados por sql/create_tables.sql já nascem com todas as versões registradas; bancos
+antigos em que as migrações foram aplicadas à mão podem ser marcados com `baseline`.
+
+Uso (roda na imagem do ETL, ver docker/start-cron.sh):
+    python tools/migrate.py                      # aplica as pendentes e cria as partições futuras
+    python tools/migrate.py status
+    python tools/migrate.py baseline 004         # marca 001..004 como aplicadas sem executá-las
+    python tools/migrate.py partitions [--archive]
+"""
+import argparse
+import glob
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+from sqlalchemy import text
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.db import create_etl_engine
+from common.partitions import maintain_partitions
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'sql', 'migrations')
+
+
+def available_migrations():
+    """{versão: caminho} em ordem; a versão é o nome do arquivo sem .sql (ex.: 003_weather_raw_typed_columns)."""
+    paths = sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '*.sql')))
+    return {os.path.splitext(os.path.basename(path))[0]: path for path in paths}
+
+
+def split_statements(sql):
+    """Divide um script em comandos, entendendo DELIMITER como o cliente mysql (para triggers)."""
+    statements, current, delimiter = [], [], ';'
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not current and (not stripped or stripped.startswith('--')):
+            continue
+        if stripped.upper().startswith('DELIMITER '):
+            delimiter = stripped.split(None, 1)[1]
+            continue
+        if stripped.endswith(delimiter):
+            current.append(line.rstrip()[:-len(delimiter)])
+            statements.append('\n'.join(current).strip())
+            current = []
+        else:
+            current.append(line)
+    if ''.join(current).strip():
+        statements.append('\n'.join(current).strip())
+    return [statement for statement in statements if statement]
+
+
+def ensure_migrations_table(engine):
+    with engine.begin() as conn:
+        conn.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                versao VARCHAR(255) PRIMARY KEY,
+                aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """))
+
+
+def applied_migrations(engine):
+    with engine.connect() as conn:
+        return {row[0] for row in conn.execute(text("SELECT versao FROM schema_migrations"))}
+
+
+def record_migration(engine, version):
+    with engine.begin() as conn:
+        conn.execute(text("INSERT IGNORE INTO schema_migrations (versao) VALUES (:versao)"), {'versao': version})
+
+
+def migrate(engine):
+    """Aplica as migrações pendentes em ordem; para na primeira falha. Devolve as aplicadas."""
+    ensure_migrations_table(engine)
+    done = applied_migrations(engine)
+    applied = []
+    for version, path in available_migrations().items():
+        if version in done:
+            continue
+        with open(path, encoding='utf-8') as handle:
+            statements = split_statements(handle.read())
+        logger.info(f"Aplicando {version} ({len(statements)} comandos)")
+        # DDL no MySQL faz commit implícito: cada comando é aplicado isoladamente e a
+        # versão só é registrada quando o arquivo inteiro terminou
+        with engine.connect() as conn:
+            for statement in statements:
+                try:
+                    conn.execute(text(statement))
+                    conn.commit()
+                except Exception as e:
+                    logger.error(f"Falha em {version}: {e}\n{statement}")
+                    raise
+        record_migration(engine, version)
+        applied.append(version)
+    if not applied:
+        logger.info("Nenhuma migração pendente")
+    return applied
+
+
+def baseline(engine, upto):
+    """Registra como aplicadas, sem executar, as migrações com número até `upto`."""
+    ensure_migrations_table(engine)
+    for version in available_migrations():
+        if version.split('_', 1)[0] <= upto:
+            record_migration(engine, version)
+            logger.info(f"{version} marcada como aplicada")
+
+
+def status(engine):
+    ensure_migrations_table(engine)
+    done = applied_migrations(engine)
+    for version in available_migrations():
+        print(f"{'aplicada' if version in done else 'pendente':9} {version}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrações versionadas e manutenção de partições")
+    parser.add_argument('command', nargs='?', choices=['up', 'status', 'baseline', 'partitions'], default='up')
+    parser.add_argument('version', nargs='?', help="baseline: última versão já aplicada (ex.: 004)")
+    parser.add_argument('--archive', action='store_true',
+                        help="partitions: arquiva as partições dos dados brutos mais antigas que RAW_RETENTION_MONTHS meses")
+    args = parser.parse_args()
+    if args.command == 'baseline' and not args.version:
+        parser.error("baseline precisa da versão (ex.: 004)")
+
+    load_dotenv()
+    database_url = os.getenv('DATABASE_URL')
+    if not database_url:
+        logger.error("DATABASE_URL não encontrada no arquivo .env")
+        sys.exit(1)
+    engine = create_etl_engine(database_url)
+
+    if args.command == 'status':
+        status(engine)
+    elif args.command == 'baseline':
+        baseline(engine, args.version)
+    else:
+        if args.command == 'up':
+            migrate(engine)
+        maintain_partitions(engine, archive=args.archive)
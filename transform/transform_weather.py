@@ -1,9 +1,18 @@
 import pandas as pd
-from sqlalchemy import create_engine, text
+from sqlalchemy import text, bindparam
 from dotenv import load_dotenv
 import os
+import sys
 import json
 import logging
+import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import metrics
+from common.bulk_loader import bulk_upsert
+from common.db import create_etl_engine
+from common.hourly import HOURLY_FIELDS, daily_from_hourly
+from common.snapshot import publish_snapshot
 
 # Configurar logging
 logging.basicConfig(
@@ -12,84 +21,470 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-def transform_weather():
-    # Carregar variáveis do .env
-    load_dotenv()
-    database_url = os.getenv('DATABASE_URL')
+WATERMARK_KEY = 'transform_watermark'
+CHECKPOINT_KEY = 'transform_checkpoint'
+# fonte horária (TRANSFORM_SOURCE=hourly) tem watermark e checkpoint próprios, sobre weather_hourly_raw
+HOURLY_WATERMARK_KEY = 'transform_hourly_watermark'
+HOURLY_CHECKPOINT_KEY = 'transform_hourly_checkpoint'
+# momento da última carga em weather_daily (por qualquer caminho); o dashboard usa como versão dos dados
+LOADED_KEY = 'daily_loaded_at'
 
-    if not database_url:
-        logger.error("DATABASE_URL não encontrada no arquivo .env")
-        return
-    
-    engine = create_engine(database_url)
+# coluna em weather_daily -> chave no JSON de weather_raw.raw_data
+RAW_FIELDS = {
+    'temperatura_maxima': 'temperature_2m_max',
+    'temperatura_minima': 'temperature_2m_min',
+    'precipitacao_total': 'precipitation_sum'
+}
 
-    logger.info("Iniciando transformação dos dados climáticos")
 
-    # Ler dados da tabela weather_raw
-    query = "SELECT regiao, data, raw_data FROM weather_raw"
-    df_raw = pd.read_sql(query, engine)
+def get_state(engine, key):
+    with engine.connect() as conn:
+        row = conn.execute(text("SELECT valor FROM etl_state WHERE chave = :chave"), {'chave': key}).fetchone()
+    return row[0] if row else None
 
-    if df_raw.empty:
-        logger.warning("Tabela weather_raw está vazia")
-        return
 
-    all_weather_data = []
+def set_state(conn, key, value):
+    conn.execute(text("""
+        INSERT INTO etl_state (chave, valor)
+        VALUES (:chave, :valor)
+        ON DUPLICATE KEY UPDATE valor = VALUES(valor)
+    """), {'chave': key, 'valor': value})
 
-    for _, row in df_raw.iterrows():
-        raw_data = json.loads(row['raw_data'])
 
-        all_weather_data.append({
-            'regiao': row['regiao'],
-            'data': row['data'],
-            'temperatura_maxima': raw_data.get('temperature_2m_max'),
-            'temperatura_minima': raw_data.get('temperature_2m_min'),
-            'precipitacao_total': raw_data.get('precipitation_sum')
-        })
+def clear_state(conn, key):
+    conn.execute(text("DELETE FROM etl_state WHERE chave = :chave"), {'chave': key})
 
-    df = pd.DataFrame(all_weather_data)
 
-    # Tratamentos
+def raw_columns(decode='sql'):
+    """Colunas do SELECT em weather_raw conforme o modo de decodificação.
+
+    No modo 'sql' o MySQL extrai os campos do JSON e devolve uma coluna por métrica;
+    no modo 'python' o JSON bruto vem inteiro e é decodificado em lote por decode_raw.
+    """
+    if decode == 'sql':
+        return ", ".join(
+            f"JSON_UNQUOTE(JSON_EXTRACT(raw_data, '$.{key}')) AS {column}"
+            for column, key in RAW_FIELDS.items()
+        )
+    return "raw_data"
+
+
+def decode_raw(df_raw):
+    """Converte o resultado de weather_raw em colunas numéricas tipadas sem laço por linha."""
+    df = df_raw[['regiao', 'data']].copy()
+    if 'raw_data' in df_raw.columns:
+        # um único json.loads sobre o array de todos os documentos em vez de um por linha
+        documents = json.loads('[' + ','.join(df_raw['raw_data'].fillna('{}')) + ']')
+        values = pd.DataFrame.from_records(documents, columns=list(RAW_FIELDS.values()), index=df_raw.index)
+        for column, key in RAW_FIELDS.items():
+            df[column] = pd.to_numeric(values[key], errors='coerce')
+    else:
+        # JSON null chega como a string 'null' e vira NaN aqui
+        for column in RAW_FIELDS:
+            df[column] = pd.to_numeric(df_raw[column], errors='coerce')
     df['data'] = pd.to_datetime(df['data'])
-    df['temperatura_maxima'] = pd.to_numeric(df['temperatura_maxima'], errors='coerce')
-    df['temperatura_minima'] = pd.to_numeric(df['temperatura_minima'], errors='coerce')
-    df['precipitacao_total'] = pd.to_numeric(df['precipitacao_total'], errors='coerce')
+    return df
+
 
-    df = df.dropna()
+def read_raw_chunks(engine, columns, since=None, chunk_size=None, after=None, table='weather_raw', key='regiao'):
+    """Lê weather_raw (ou `table`, ex.: weather_hourly_raw) em páginas ordenadas por (`key`, data).
 
-    # Feature engineering
+    Sem chunk_size devolve tudo num único DataFrame. Com chunk_size usa paginação
+    por chave (keyset) a partir de `after` = (`key`, data), de modo que cada página
+    custa o mesmo independentemente de quantas já foram lidas. `key` é a coluna de
+    região da chave da tabela: regiao em weather_raw, regiao_id em weather_hourly_raw.
+    """
+    selected = "regiao" if key == 'regiao' else f"{key}, regiao"
+    while True:
+        filters = []
+        params = {}
+        if since is not None:
+            filters.append("updated_at >= :since")
+            params['since'] = since
+        if after is not None:
+            filters.append(f"({key} > :regiao OR ({key} = :regiao AND data > :data))")
+            params['regiao'], params['data'] = after
+        query = f"SELECT {selected}, data, {columns}, updated_at FROM {table}"
+        if filters:
+            query += " WHERE " + " AND ".join(filters)
+        if chunk_size:
+            query += f" ORDER BY {key}, data LIMIT :limit"
+            params['limit'] = chunk_size
+
+        with metrics.timer('raw_read'):
+            chunk = pd.read_sql(text(query), engine, params=params)
+        if chunk.empty:
+            return
+        yield chunk
+        if not chunk_size or len(chunk) < chunk_size:
+            return
+        last = chunk.iloc[-1]
+        after = (page_key(last, key), str(last['data']))
+
+
+def page_key(row, key):
+    # escalares do NumPy (regiao_id) não passam pelo driver nem pelo json
+    value = row[key]
+    return value.item() if hasattr(value, 'item') else value
+
+
+def enrich(df):
+    """Tratamentos e feature engineering sobre colunas já tipadas."""
+    df = df.dropna(subset=list(RAW_FIELDS)).copy()
     df['amplitude_termica'] = df['temperatura_maxima'] - df['temperatura_minima']
+    return df
 
-    if df.empty:
-        logger.warning("Nenhum dado válido após transformação")
-        return
 
-    # Batch UPSERT
+def transform_chunk(df_raw, source='daily'):
+    with metrics.timer('parse'):
+        if source == 'hourly':
+            # máxima, mínima e soma das 24 horas calculadas em NumPy sobre todas as linhas da página
+            return enrich(daily_from_hourly(df_raw))
+        return enrich(decode_raw(df_raw))
+
+
+DAILY_COLUMNS = ['regiao', 'data', 'temperatura_maxima', 'temperatura_minima', 'precipitacao_total', 'amplitude_termica']
+
+
+def upsert_daily(conn, df):
+    bulk_upsert(conn, 'weather_daily', df[DAILY_COLUMNS], update_columns=DAILY_COLUMNS[2:])
+
+
+# limiares dos dias extremos contados em weather_monthly
+HOT_DAY_MAX = 30.0
+COLD_DAY_MIN = 12.0
+HEAVY_RAIN_MM = 20.0
+
+
+MONTHLY_COLUMNS = """
+    regiao, ano, mes, dias,
+    temperatura_maxima_media, temperatura_minima_media, precipitacao_total, amplitude_media,
+    dias_calor_extremo, dias_frio_extremo, dias_chuva_forte
+"""
+MONTHLY_AGGREGATES = """
+    COUNT(*),
+    AVG(d.temperatura_maxima), AVG(d.temperatura_minima), SUM(d.precipitacao_total), AVG(d.amplitude_termica),
+    SUM(d.temperatura_maxima >= :calor), SUM(d.temperatura_minima <= :frio), SUM(d.precipitacao_total >= :chuva)
+"""
+MONTHLY_ON_DUPLICATE = """
+    ON DUPLICATE KEY UPDATE
+        dias = VALUES(dias),
+        temperatura_maxima_media = VALUES(temperatura_maxima_media),
+        temperatura_minima_media = VALUES(temperatura_minima_media),
+        precipitacao_total = VALUES(precipitacao_total),
+        amplitude_media = VALUES(amplitude_media),
+        dias_calor_extremo = VALUES(dias_calor_extremo),
+        dias_frio_extremo = VALUES(dias_frio_extremo),
+        dias_chuva_forte = VALUES(dias_chuva_forte)
+"""
+THRESHOLDS = {'calor': HOT_DAY_MAX, 'frio': COLD_DAY_MIN, 'chuva': HEAVY_RAIN_MM}
+
+
+def refresh_monthly(conn, df):
+    """Recalcula em weather_monthly os meses (região × ano × mês) presentes em df.
+
+    Roda na mesma transação do upsert diário, então lê weather_daily já atualizada e
+    o rollup nunca fica atrás dos dados diários.
+    """
+    touched = df[['regiao']].assign(ano=df['data'].dt.year, mes=df['data'].dt.month).drop_duplicates()
+    statement = text(f"""
+        INSERT INTO weather_monthly ({MONTHLY_COLUMNS})
+        SELECT d.regiao, :ano, :mes, {MONTHLY_AGGREGATES}
+        FROM weather_daily d
+        -- filtra pelo id para usar a chave (regiao_id, data) de weather_daily
+        WHERE d.regiao_id IN (SELECT regiao_id FROM dim_regiao WHERE nome IN :regioes)
+          AND d.data >= :inicio AND d.data < :fim
+        GROUP BY d.regiao
+        {MONTHLY_ON_DUPLICATE}
+    """).bindparams(bindparam('regioes', expanding=True))
+
+    # um comando por mês cobrindo todas as regiões tocadas naquele mês
+    for (ano, mes), group in touched.groupby(['ano', 'mes']):
+        ano, mes = int(ano), int(mes)
+        conn.execute(statement, {
+            'ano': ano,
+            'mes': mes,
+            'regioes': group['regiao'].tolist(),
+            'inicio': datetime.date(ano, mes, 1),
+            'fim': datetime.date(ano + mes // 12, mes % 12 + 1, 1),
+            **THRESHOLDS
+        })
+    return len(touched)
+
+
+def transform_in_database(engine, since=None):
+    """Modo 'sql': a transformação inteira roda no MySQL com comandos set-based.
+
+    Usa as colunas tipadas de weather_raw (geradas a partir do JSON, ver
+    sql/migrations/003) e move para weather_daily só as linhas alteradas desde
+    `since`; em seguida recalcula no rollup os meses tocados. Devolve
+    (linhas afetadas, novo watermark).
+    """
+    delta = "WHERE r.updated_at >= :since" if since is not None else ""
+    params = {'since': since, **THRESHOLDS}
+
     with engine.begin() as conn:
-        conn.execute(text("""
+        # Não é o mesmo recorte dos comandos abaixo: o SELECT simples usa o snapshot da transação,
+        # mas INSERT ... SELECT faz leitura com lock (a versão corrente) e pode ver linhas gravadas
+        # depois dele. Isso só reprocessa linhas a mais; uma linha commitada com updated_at anterior
+        # ao MAX lido aqui volta no próximo recorte, que recua TRANSFORM_WATERMARK_LAG_SECONDS, e o
+        # upsert é idempotente.
+        new_watermark = conn.execute(text(f"SELECT MAX(r.updated_at) FROM weather_raw r {delta}"), params).scalar()
+        if new_watermark is None:
+            return 0, None
+
+        result = conn.execute(text(f"""
             INSERT INTO weather_daily (
-                regiao,
-                data,
-                temperatura_maxima,
-                temperatura_minima,
-                precipitacao_total,
-                amplitude_termica
-            )
-            VALUES (
-                :regiao,
-                :data,
-                :temperatura_maxima,
-                :temperatura_minima,
-                :precipitacao_total,
-                :amplitude_termica
+                regiao, data, temperatura_maxima, temperatura_minima, precipitacao_total, amplitude_termica
             )
+            SELECT
+                r.regiao, r.data, r.temperatura_maxima, r.temperatura_minima, r.precipitacao_total,
+                r.temperatura_maxima - r.temperatura_minima
+            FROM weather_raw r
+            {delta or 'WHERE TRUE'}
+              AND r.temperatura_maxima IS NOT NULL
+              AND r.temperatura_minima IS NOT NULL
+              AND r.precipitacao_total IS NOT NULL
             ON DUPLICATE KEY UPDATE
                 temperatura_maxima = VALUES(temperatura_maxima),
                 temperatura_minima = VALUES(temperatura_minima),
                 precipitacao_total = VALUES(precipitacao_total),
                 amplitude_termica = VALUES(amplitude_termica)
-        """), df.to_dict(orient='records'))
+        """), params)
+
+        # meses tocados pelo delta, recalculados direto de weather_daily pela chave (regiao_id, data)
+        conn.execute(text(f"""
+            INSERT INTO weather_monthly ({MONTHLY_COLUMNS})
+            SELECT d.regiao, YEAR(d.data), MONTH(d.data), {MONTHLY_AGGREGATES}
+            FROM weather_daily d
+            JOIN (
+                SELECT DISTINCT g.regiao_id, CAST(DATE_FORMAT(r.data, '%Y-%m-01') AS DATE) AS inicio
+                FROM weather_raw r
+                JOIN dim_regiao g ON g.nome = r.regiao
+                {delta}
+            ) t ON d.regiao_id = t.regiao_id AND d.data >= t.inicio AND d.data < t.inicio + INTERVAL 1 MONTH
+            GROUP BY d.regiao, YEAR(d.data), MONTH(d.data)
+            {MONTHLY_ON_DUPLICATE}
+        """), params)
+
+        set_state(conn, WATERMARK_KEY, str(new_watermark))
+        set_state(conn, LOADED_KEY, str(datetime.datetime.now()))
+    return result.rowcount, str(new_watermark)
+
+
+def load_records(engine, df):
+    """Carrega registros já tipados (regiao, data, métricas) direto em weather_daily e no rollup.
+
+    Usado pelo pipeline em processo único, que entrega o que acabou de extrair sem
+    reler weather_raw.
+    """
+    df = enrich(df)
+    if df.empty:
+        logger.warning("Nenhum dado válido após transformação")
+        return 0
+    with metrics.timer('load'), engine.begin() as conn:
+        upsert_daily(conn, df)
+        refresh_monthly(conn, df)
+        set_state(conn, LOADED_KEY, str(datetime.datetime.now()))
+    metrics.incr('rows_written', len(df))
+    logger.info(f"Transformação e carga concluídas com sucesso - {len(df)} linhas")
+    return len(df)
+
+
+def publish(engine):
+    # Snapshot Parquet para o dashboard; falhas aqui não invalidam a carga já commitada
+    if os.getenv('SNAPSHOT', '1').lower() not in ('1', 'true', 'yes'):
+        return
+    try:
+        with metrics.timer('snapshot'):
+            publish_snapshot(engine)
+    except ImportError:
+        logger.warning("pyarrow não instalado, snapshot Parquet não publicado")
+    except Exception as e:
+        logger.error(f"Falha ao publicar snapshot: {e}")
+        metrics.incr('snapshot_failures')
+
+
+def transform_weather(full=False, chunk_size=None, engine=None, snapshot=True, mode=None, source=None):
+    if engine is None:
+        # Carregar variáveis do .env
+        load_dotenv()
+        database_url = os.getenv('DATABASE_URL')
+
+        if not database_url:
+            logger.error("DATABASE_URL não encontrada no arquivo .env")
+            return
+
+        engine = create_etl_engine(database_url)
+
+    with metrics.track_run(engine, 'transform'):
+        logger.info("Iniciando transformação dos dados climáticos")
+
+        mode = mode or os.getenv('TRANSFORM_MODE', 'pandas')
+        source = source or os.getenv('TRANSFORM_SOURCE', 'daily')
+        if source == 'hourly' and mode == 'sql':
+            # os BLOBs float32 não são legíveis em SQL; a agregação horária roda no pandas/NumPy
+            logger.warning("TRANSFORM_SOURCE=hourly não é suportado no modo sql, usando o modo pandas")
+            mode = 'pandas'
+        if mode == 'sql':
+            watermark = None if full else get_state(engine, WATERMARK_KEY)
+            since = None
+            if watermark:
+                lag = datetime.timedelta(seconds=int(os.getenv('TRANSFORM_WATERMARK_LAG_SECONDS', '300')))
+                since = datetime.datetime.fromisoformat(watermark) - lag
+            with metrics.timer('load'):
+                rows, new_watermark = transform_in_database(engine, since)
+            if new_watermark is None:
+                logger.info("Nenhuma alteração em weather_raw desde a última transformação")
+                return
+            # o dialeto MySQL do SQLAlchemy liga CLIENT.FOUND_ROWS: linhas idênticas também entram no
+            # rowcount, então ele não diz se algo mudou; o snapshot depende do avanço do watermark
+            logger.info(f"Transformação no banco concluída - rowcount {rows}, watermark {new_watermark}")
+            metrics.incr('rows_affected', rows)
+            metrics.set_info('watermark', new_watermark)
+            if snapshot and new_watermark != watermark:
+                publish(engine)
+            return
+
+        if source == 'hourly':
+            table, columns, key = 'weather_hourly_raw', ", ".join(HOURLY_FIELDS.values()), 'regiao_id'
+            watermark_key, checkpoint_key = HOURLY_WATERMARK_KEY, HOURLY_CHECKPOINT_KEY
+        else:
+            table, columns, key = 'weather_raw', raw_columns(os.getenv('TRANSFORM_DECODE', 'sql')), 'regiao'
+            watermark_key, checkpoint_key = WATERMARK_KEY, CHECKPOINT_KEY
+        if chunk_size is None and os.getenv('TRANSFORM_CHUNK_SIZE'):
+            chunk_size = int(os.getenv('TRANSFORM_CHUNK_SIZE'))
+
+        # Retomar uma execução em streaming interrompida: mesmo recorte (since) a partir da última chave gravada
+        checkpoint = get_state(engine, checkpoint_key) if chunk_size and not full else None
+        if checkpoint:
+            checkpoint = json.loads(checkpoint)
+            since = datetime.datetime.fromisoformat(checkpoint['since']) if checkpoint['since'] else None
+            after = (checkpoint['regiao'], checkpoint['data'])
+            new_watermark = checkpoint['watermark']
+            logger.info(f"Retomando transformação a partir de {after[0]} / {after[1]}")
+        else:
+            after = None
+            new_watermark = None
+            # Ler da tabela bruta apenas o que mudou desde a última execução (ou tudo, com full=True)
+            watermark = None if full else get_state(engine, watermark_key)
+            if watermark:
+                # recua um pouco o watermark para pegar linhas de transações que commitaram depois da leitura anterior
+                lag = datetime.timedelta(seconds=int(os.getenv('TRANSFORM_WATERMARK_LAG_SECONDS', '300')))
+                since = datetime.datetime.fromisoformat(watermark) - lag
+                logger.info(f"Transformação incremental: linhas alteradas desde {since}")
+            else:
+                since = None
+                logger.info(f"Transformação completa de {table}")
+
+        rows_read = 0
+        rows_loaded = 0
+        for df_raw in read_raw_chunks(engine, columns, since=since, chunk_size=chunk_size, after=after,
+                                      table=table, key=key):
+            rows_read += len(df_raw)
+            chunk_watermark = str(df_raw['updated_at'].max())
+            new_watermark = max(new_watermark, chunk_watermark) if new_watermark else chunk_watermark
+            df = transform_chunk(df_raw, source)
+
+            # cada página numa transação própria; o checkpoint avança junto com a carga
+            with metrics.timer('load'), engine.begin() as conn:
+                if not df.empty:
+                    upsert_daily(conn, df)
+                    refresh_monthly(conn, df)
+                if chunk_size:
+                    last = df_raw.iloc[-1]
+                    set_state(conn, checkpoint_key, json.dumps({
+                        'regiao': page_key(last, key),
+                        'data': str(last['data']),
+                        'since': str(since) if since is not None else None,
+                        'watermark': new_watermark
+                    }))
+            rows_loaded += len(df)
+            metrics.incr('rows_read', len(df_raw))
+            metrics.incr('rows_written', len(df))
+            if chunk_size:
+                logger.info(f"Página carregada até {last['regiao']} / {last['data']} - {rows_loaded} linhas até agora")
+
+        if rows_read == 0 and not checkpoint:
+            if since is not None:
+                logger.info(f"Nenhuma alteração em {table} desde a última transformação")
+            else:
+                logger.warning(f"Tabela {table} está vazia")
+            return
+
+        # o watermark só avança depois que todas as páginas foram carregadas
+        with engine.begin() as conn:
+            if new_watermark:
+                set_state(conn, watermark_key, new_watermark)
+                metrics.set_info('watermark', new_watermark)
+            if rows_loaded:
+                set_state(conn, LOADED_KEY, str(datetime.datetime.now()))
+            clear_state(conn, checkpoint_key)
+
+        if rows_loaded == 0:
+            logger.warning("Nenhum dado válido após transformação")
+            return
+
+        logger.info(f"Transformação e carga concluídas com sucesso - {rows_loaded} linhas")
+
+        if snapshot:
+            publish(engine)
+
+def transform_records(engine, df, snapshot=True):
+    """Transformação a partir dos registros entregues pela extração no mesmo processo (scheduler).
+
+    Carrega `df` (saída do RecordCollector) sem reler nem decodificar weather_raw. Para o
+    watermark continuar valendo, confere antes numa consulta só de chaves (regiao, data,
+    updated_at, pelo índice de updated_at) se todas as linhas alteradas desde ele estão
+    em `df`. Se alguma ficou de fora (gravação de outro processo), ou se a fonte/modo
+    configurados não são o pandas diário, roda a transformação incremental normal.
+    """
+    watermark = get_state(engine, WATERMARK_KEY)
+    source = os.getenv('TRANSFORM_SOURCE', 'daily')
+    mode = os.getenv('TRANSFORM_MODE', 'pandas')
+    if df.empty or not watermark or source != 'daily' or mode == 'sql':
+        return transform_weather(engine=engine, snapshot=snapshot)
+
+    lag = datetime.timedelta(seconds=int(os.getenv('TRANSFORM_WATERMARK_LAG_SECONDS', '300')))
+    since = datetime.datetime.fromisoformat(watermark) - lag
+    with metrics.timer('raw_read'):
+        changed = pd.read_sql(
+            text("SELECT regiao, data, updated_at FROM weather_raw WHERE updated_at >= :since"),
+            engine, params={'since': since}
+        )
+    df = df.drop_duplicates(['regiao', 'data'], keep='last')
+    collected = set(zip(df['regiao'], df['data'].dt.strftime('%Y-%m-%d')))
+    missing = [
+        key for key in zip(changed['regiao'], pd.to_datetime(changed['data']).dt.strftime('%Y-%m-%d'))
+        if key not in collected
+    ]
+    if missing:
+        logger.info(f"{len(missing)} linhas alteradas fora desta execução, relendo o delta de weather_raw")
+        return transform_weather(engine=engine, snapshot=snapshot)
+
+    with metrics.track_run(engine, 'transform'):
+        logger.info(f"Transformação dos {len(df)} registros recebidos da extração")
+        metrics.incr('rows_read', len(df))
+        loaded = load_records(engine, df)
+        if not changed.empty:
+            # todas as linhas do delta foram carregadas acima: o watermark pode avançar
+            new_watermark = str(changed['updated_at'].max())
+            with engine.begin() as conn:
+                set_state(conn, WATERMARK_KEY, new_watermark)
+            metrics.set_info('watermark', new_watermark)
+        if loaded and snapshot:
+            publish(engine)
 
-    logger.info("Transformação e carga concluídas com sucesso")
 
 if __name__ == "__main__":
-    transform_weather()
+    import argparse
+    parser = argparse.ArgumentParser(description="Transforma weather_raw em weather_daily")
+    parser.add_argument('--full', action='store_true', help="reprocessa toda a weather_raw ignorando o watermark")
+    parser.add_argument('--chunk-size', type=int, default=None,
+                        help="modo streaming: processa weather_raw em páginas desse tamanho, cada uma na sua transação")
+    parser.add_argument('--mode', choices=['pandas', 'sql'], default=None,
+                        help="sql: INSERT ... SELECT dentro do MySQL sobre as colunas tipadas de weather_raw")
+    parser.add_argument('--source', choices=['daily', 'hourly'], default=None,
+                        help="hourly: deriva as métricas diárias das 24 horas de weather_hourly_raw (requer EXTRACT_HOURLY)")
+    args = parser.parse_args()
+    transform_weather(full=args.full, chunk_size=args.chunk_size, mode=args.mode, source=args.source)